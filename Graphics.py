@@ -1,4 +1,5 @@
 import pandas as pd
+from results_store import load_results
 import matplotlib.pyplot as plt
 import seaborn as sns
 import re
@@ -6,7 +7,8 @@ import os
 from mpl_toolkits.mplot3d import Axes3D
 
 # ========= CONFIGURACIÓN =========
-INPUT_FILE = "resultados_pruebas.csv"
+INPUT_FILE = "resultados_pruebas.csv"   # CSV antiguo, se carga junto con RESULTS_DIR
+RESULTS_DIR = "resultados_pruebas"
 OUTPUT_DIR = "graficas_resultados"
 
 # Crear carpeta de salida si no existe
@@ -18,7 +20,7 @@ def sanitize_filename(name: str) -> str:
     return re.sub(r'[<>:"/\\|?*]', '_', str(name))
 
 # ========= CARGA DE DATOS =========
-df = pd.read_csv(INPUT_FILE)
+df = load_results(RESULTS_DIR, legacy_csv=INPUT_FILE)
 print(f"✅ Datos cargados: {len(df)} filas")
 
 # Filtramos por si hay errores o NaN
@@ -1,17 +1,19 @@
 import os
 import pandas as pd
+from results_store import load_results
 import plotly.graph_objects as go
 import plotly.express as px
 
 # === Configuración ===
-INPUT_FILE = "resultados_pruebas.csv"
+INPUT_FILE = "resultados_pruebas.csv"   # CSV antiguo, se carga junto con RESULTS_DIR
+RESULTS_DIR = "resultados_pruebas"
 OUTPUT_DIR = "graficas_resultados"
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 os.makedirs(os.path.join(OUTPUT_DIR, "graficas_3D_heuristicas_Astar"), exist_ok=True)
 
 # === Cargar datos ===
-df = pd.read_csv(INPUT_FILE)
+df = load_results(RESULTS_DIR, legacy_csv=INPUT_FILE)
 
 # Filtrar solo A* y casos válidos
 df_astar = df[
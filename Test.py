@@ -1,110 +1,306 @@
 import time
-import pandas as pd
-from tqdm import tqdm
-from water_sort_solver import WaterSortGame, SearchAlgorithm
+from water_sort_solver import WaterSortGame, SearchAlgorithm, SearchBudget
+from solution_store import default_store
+from results_store import ResultsStore
+import multiprocessing as mp
+from multiprocessing.connection import wait
 import os
+import sys
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+# tqdm y pandas (este en results_store) se importan solo dentro de las funciones que
+# los usan, así batch.py puede usar ejecutar_algoritmo sin pagar lo que tardan en cargarse.
 
 
 num_tubes_range = range(5, 13)   # tubos de 5 a 12
 seeds = range(10)                # 10 semillas
 algoritmos = ["BFS", "DFS", "A*_h1", "A*_h2", "A*_h3"]
+# Voraz y beam search no dan caminos óptimos: solo entran en el barrido con
+# INCLUIR_NO_OPTIMOS = True, para no mezclarlos en las gráficas de los óptimos
+ALGORITMOS_NO_OPTIMOS = ["Greedy_h2", "Beam_h2"]
+INCLUIR_NO_OPTIMOS = False
+BEAM_WIDTH = 100
+# Los resultados se guardan por tandas en la carpeta RESULTS_DIR (results_store);
+# OUTPUT_FILE es el CSV de antes, que se sigue leyendo para reanudar y en las gráficas
+RESULTS_DIR = "resultados_pruebas"
 OUTPUT_FILE = "resultados_pruebas.csv"
 
-def ejecutar_algoritmo(game, solver, initial_state, algoritmo):
+# Cada prueba se ejecuta en su propio proceso, con tantos procesos a la vez como
+# núcleos. Las búsquedas se paran solas al llegar a TIEMPO_MAX_SEG (SearchBudget);
+# si aun así una prueba pasa del tiempo (con un margen) o de la memoria (RSS)
+# máxima, se mata. En los dos casos se guarda con error "timeout" / "oom".
+NUM_PROCESOS = os.cpu_count() or 1
+TIEMPO_MAX_SEG = 600
+MARGEN_KILL_SEG = 30
+MEMORIA_MAX_MB = 4096
+
+# Con USAR_ALMACEN = True las soluciones se guardan en el almacén SQLite de
+# solution_store y, si la misma partida (aunque sea con otra semilla y los tubos en
+# otro orden) ya se resolvió con el mismo algoritmo, se leen de ahí en vez de volver
+# a buscar. Los tiempos de esas filas son los de la búsqueda original y la columna
+# desde_almacen las marca. No se usa al perfilar ni al medir memoria, que tienen que
+# medir búsquedas de verdad.
+USAR_ALMACEN = False
+
+# Con PERFILAR = True las búsquedas miden cada fase (SearchAlgorithm(profile=True))
+# y el CSV gana las columnas perfil_<fase>_ms / perfil_<fase>_llamadas.
+PERFILAR = False
+
+# Con MEDIR_MEMORIA = True se mide la memoria real de cada búsqueda
+# (SearchAlgorithm(measure_memory=True)) y el CSV gana las columnas
+# memoria_pico_tracemalloc_mb y memoria_pico_rss_mb junto a nodos_en_memoria_max.
+MEDIR_MEMORIA = False
+
+# Con DEDUPLICAR = True las partidas equivalentes (el mismo puzle con los tubos en
+# otro orden o los colores renombrados, misma canonical_key con fold_colors) se
+# resuelven una sola vez por algoritmo y el resultado se copia a todas sus filas;
+# la columna seed_resuelta dice con qué semilla se resolvió de verdad. Solo se
+# calcula una clave por partida, así que el coste de fold_colors aquí no importa; en
+# los casos con muchos colores empatados la clave no es del todo canónica (ver
+# canonical_key) y puede quedar alguna partida repetida sin juntar, nunca se juntan
+# dos distintas.
+DEDUPLICAR = True
+
+
+# Nombres de algoritmo: "BFS", "DFS", "DLS_<límite>" y "<búsqueda>_<heurística>" con
+# búsqueda A*, IDA*, Greedy o Beam y heurística h1, h2, h3 o h_pdb (esta última
+# necesita un SearchAlgorithm con pattern_db). Con con_camino=True las stats llevan
+# también los movimientos de la solución en "camino".
+def ejecutar_algoritmo(game, solver, initial_state, algoritmo, budget=None, store=None, beam_width=BEAM_WIDTH,
+                       con_camino=False):
     start = time.time()
     try:
-        if algoritmo == "BFS":
-            path, stats = solver.bfs(initial_state)
+        # en el almacén el beam search lleva su ancho en el nombre, como en main.py
+        nombre_almacen = f"{algoritmo}_w{beam_width}" if algoritmo.startswith("Beam_h") else algoritmo
+        guardado = store.get(solver, initial_state, nombre_almacen) if store is not None else None
+        if guardado is not None:
+            path, stats = guardado
+        elif algoritmo == "BFS":
+            path, stats = solver.bfs(initial_state, budget=budget)
         elif algoritmo == "DFS":
-            path, stats = solver.dfs(initial_state)
-        elif algoritmo == "A*_h1":
-            path, stats = solver.a_star(initial_state, solver.h1)
-        elif algoritmo == "A*_h2":
-            path, stats = solver.a_star(initial_state, solver.h2)
-        elif algoritmo == "A*_h3":
-            path, stats = solver.a_star(initial_state, solver.h3)
+            path, stats = solver.dfs(initial_state, budget=budget)
+        elif algoritmo.startswith("DLS_"):
+            path, stats = solver.dls(initial_state, int(algoritmo.split("_")[1]), budget=budget)
+        elif algoritmo.startswith("A*_h"):
+            path, stats = solver.a_star(initial_state, heuristica(solver, algoritmo), budget=budget)
+        elif algoritmo.startswith("IDA*_h"):
+            path, stats = solver.ida_star(initial_state, heuristica(solver, algoritmo), budget=budget)
+        elif algoritmo.startswith("Greedy_h"):
+            path, stats = solver.greedy_best_first(initial_state, heuristica(solver, algoritmo), budget=budget)
+        elif algoritmo.startswith("Beam_h"):
+            path, stats = solver.beam_search(initial_state, heuristica(solver, algoritmo), width=beam_width, budget=budget)
         else:
             raise ValueError(f"Algoritmo no reconocido: {algoritmo}")
-
-        elapsed = time.time() - start
-        stats["tiempo_total"] = elapsed
+        if guardado is None:
+            stats["tiempo_total"] = time.time() - start
+            if store is not None:
+                store.put(solver, initial_state, nombre_almacen, path, stats)
+        else:
+            # se deja el tiempo de la búsqueda guardada, no el de leerla
+            stats.setdefault("tiempo_total", stats["tiempo_seg"])
+        stats["desde_almacen"] = guardado is not None
         stats["solved"] = stats["profundidad_solucion"] is not None
-        stats["error"] = ""
+        stats["error"] = "timeout" if stats.get("status") == "budget" else ""
+        if con_camino:
+            stats["camino"] = path if isinstance(path, list) else None
         return stats
 
     except Exception as e:
         elapsed = time.time() - start
-        return {
-            "nodos_expandidos": None,
-            "nodos_en_memoria_max": None,
-            "tiempo_seg": None,
-            "tiempo_total": elapsed,
-            "profundidad_solucion": None,
-            "solved": False,
-            "error": str(e)
-        }
-
-# Reanudar las pruebas por donde se quedó antes de ser interrumpido
-
-if os.path.exists(OUTPUT_FILE):
-    df_existente = pd.read_csv(OUTPUT_FILE)
-    print(f"📂 Reanudando desde '{OUTPUT_FILE}' con {len(df_existente)} resultados previos.")
-    resultados_guardados = set(
-        tuple(row) for row in df_existente[["num_tubes", "num_colors", "seed", "algoritmo"]].values
-    )
-else:
-    df_existente = pd.DataFrame()
-    resultados_guardados = set()
+        return stats_fallida(elapsed, str(e))
 
 
+def heuristica(solver, algoritmo):
+    nombre = algoritmo.split("_", 1)[1]
+    if nombre not in ("h1", "h2", "h3", "h_pdb"):
+        raise ValueError(f"Heurística no reconocida: {nombre}")
+    if nombre == "h_pdb" and solver.pattern_db is None:
+        raise ValueError("h_pdb necesita la base de datos de patrones (en batch.py, --pattern-db)")
+    return getattr(solver, nombre)
 
 
-total_experimentos = sum(
-    (num_tubes - 3) * len(seeds) * len(algoritmos) for num_tubes in num_tubes_range
-)
-print(f"\n🚀 Iniciando {total_experimentos} pruebas...\n")
+def stats_fallida(elapsed, error):
+    return {
+        "nodos_expandidos": None,
+        "nodos_en_memoria_max": None,
+        "tiempo_seg": None,
+        "tiempo_total": elapsed,
+        "profundidad_solucion": None,
+        "solved": False,
+        "error": error
+    }
 
 
-for num_tubes in tqdm(num_tubes_range, desc="Progreso general", position=0):
-    for num_colors in range(3, num_tubes - 1):  # regla: colores <= tubos - 2
-        for seed in seeds:
-            game = WaterSortGame(num_tubes, num_colors, seed)
-            solver = SearchAlgorithm(game)
-            init_state = game.initial_state
+# Lo que se ejecuta en cada proceso hijo: resuelve una prueba y manda las stats
+def _proceso_prueba(num_tubes, num_colors, seed, algoritmo, conn):
+    game = WaterSortGame(num_tubes, num_colors, seed)
+    solver = SearchAlgorithm(game, profile=PERFILAR, measure_memory=MEDIR_MEMORIA)
+    budget = SearchBudget(max_seconds=TIEMPO_MAX_SEG)
+    store = default_store() if USAR_ALMACEN and not (PERFILAR or MEDIR_MEMORIA) else None
+    stats = ejecutar_algoritmo(game, solver, game.initial_state, algoritmo, budget, store)
+    if store is not None:
+        store.close()
+    conn.send(stats)
+    conn.close()
+
+
+def memoria_rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for linea in f:
+                if linea.startswith("VmRSS:"):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss / (1024 * 1024)
+        except psutil.Error:
+            pass
+    return 0.0
 
-            print(f"\n🧪 {num_tubes} tubos, {num_colors} colores, semilla {seed}:")
 
-            # Progreso interno por algoritmo
-            for algoritmo in tqdm(algoritmos, desc=f"  Algoritmos", position=1, leave=False):
-                clave = (num_tubes, num_colors, seed, algoritmo)
+def ejecutar_en_paralelo(pendientes, guardar):
+    from tqdm import tqdm
+    pendientes = list(pendientes)
+    en_curso = {}  # conexión -> (proceso, clave, inicio)
 
-                if clave in resultados_guardados:
-                    # Ya estaba en el CSV
-                    continue
+    with tqdm(total=len(pendientes), desc="Progreso general") as barra:
+        while pendientes or en_curso:
+            while pendientes and len(en_curso) < NUM_PROCESOS:
+                clave = pendientes.pop(0)
+                recibir, enviar = mp.Pipe(duplex=False)
+                proceso = mp.Process(target=_proceso_prueba, args=(*clave, enviar), daemon=True)
+                proceso.start()
+                enviar.close()
+                en_curso[recibir] = (proceso, clave, time.time())
 
-                stats = ejecutar_algoritmo(game, solver, init_state, algoritmo)
+            listas = wait(list(en_curso), timeout=0.2)
+
+            for conn, (proceso, clave, inicio) in list(en_curso.items()):
+                elapsed = time.time() - inicio
+                stats = None
+                if conn in listas:
+                    try:
+                        stats = conn.recv()
+                    except EOFError:
+                        proceso.join()
+                        stats = stats_fallida(elapsed, f"proceso terminado (código {proceso.exitcode})")
+                elif elapsed > TIEMPO_MAX_SEG + MARGEN_KILL_SEG:
+                    proceso.kill()
+                    stats = stats_fallida(elapsed, "timeout")
+                elif memoria_rss_mb(proceso.pid) > MEMORIA_MAX_MB:
+                    proceso.kill()
+                    stats = stats_fallida(elapsed, "oom")
+
+                if stats is not None:
+                    proceso.join()
+                    conn.close()
+                    del en_curso[conn]
+                    guardar(clave, stats)
+                    barra.update(1)
+
+
+def main():
+    lista_algoritmos = algoritmos + (ALGORITMOS_NO_OPTIMOS if INCLUIR_NO_OPTIMOS else [])
+    # Reanudar las pruebas por donde se quedó antes de ser interrumpido
+    resultados = ResultsStore(RESULTS_DIR, legacy_csv=OUTPUT_FILE)
+    resultados_guardados = resultados.keys()
+    if resultados_guardados:
+        print(f"📂 Reanudando desde '{RESULTS_DIR}' con {len(resultados_guardados)} resultados previos.")
+
+    # partidas agrupadas por puzle canónico (cada una en su grupo si no se deduplica)
+    equivalentes = {}
+    for num_tubes in num_tubes_range:
+        for num_colors in range(3, num_tubes - 1):  # regla: colores <= tubos - 2
+            for seed in seeds:
+                partida = (num_tubes, num_colors, seed)
+                if DEDUPLICAR:
+                    game = WaterSortGame(num_tubes, num_colors, seed)
+                    grupo = game.canonical_key(game.encode(game.initial_state), fold_colors=True)
+                else:
+                    grupo = partida
+                equivalentes.setdefault(grupo, []).append(partida)
+
+    # Se resuelve la primera partida de cada grupo que aún no tenga resultado y se
+    # copia a las demás que falten
+    pendientes = []
+    copias = {}  # clave de la prueba que se ejecuta -> claves que reciben su resultado
+    for partidas in equivalentes.values():
+        for algoritmo in lista_algoritmos:
+            faltan = [(*partida, algoritmo) for partida in partidas
+                      if (*partida, algoritmo) not in resultados_guardados]
+            if faltan:
+                pendientes.append(faltan[0])
+                copias[faltan[0]] = faltan
+
+    total_experimentos = sum(
+        (num_tubes - 3) * len(seeds) * len(lista_algoritmos) for num_tubes in num_tubes_range
+    )
+    total_pendientes = sum(len(faltan) for faltan in copias.values())
+    print(f"\n🚀 Iniciando {total_pendientes} de {total_experimentos} pruebas ({len(pendientes)} búsquedas"
+          f" tras quitar las partidas repetidas) en {NUM_PROCESOS} procesos...\n")
+
+    def guardar(clave, stats):
+        # Las filas se guardan por tandas (ResultsStore.append)
+        for copia in copias[clave]:
+            num_tubes, num_colors, seed, algoritmo = copia
+            nueva_fila = {
+                "num_tubes": num_tubes,
+                "num_colors": num_colors,
+                "seed": seed,
+                "algoritmo": algoritmo,
+                "nodos_expandidos": stats.get("nodos_expandidos"),
+                "nodos_en_memoria_max": stats.get("nodos_en_memoria_max"),
+                "tiempo_seg": stats.get("tiempo_seg"),
+                "tiempo_total": stats.get("tiempo_total"),
+                "profundidad_solucion": stats.get("profundidad_solucion"),
+                "solved": stats.get("solved"),
+                "error": stats.get("error", ""),
+                "seed_resuelta": clave[2],
+                "desde_almacen": stats.get("desde_almacen", False)
+            }
+            nueva_fila.update({k: v for k, v in stats.items() if k.startswith(("perfil_", "memoria_pico_"))})
+
+            resultados.append(nueva_fila)
+
+            resultados_guardados.add(copia)
+
+    # aunque se interrumpa (Ctrl+C) se escribe lo que quede en el buffer
+    try:
+        ejecutar_en_paralelo(pendientes, guardar)
+    finally:
+        resultados.close()
 
-                # Guardamos una fila en el CSV inmediatamente
-                nueva_fila = {
-                    "num_tubes": num_tubes,
-                    "num_colors": num_colors,
-                    "seed": seed,
-                    "algoritmo": algoritmo,
-                    "nodos_expandidos": stats.get("nodos_expandidos"),
-                    "nodos_en_memoria_max": stats.get("nodos_en_memoria_max"),
-                    "tiempo_seg": stats.get("tiempo_seg"),
-                    "tiempo_total": stats.get("tiempo_total"),
-                    "profundidad_solucion": stats.get("profundidad_solucion"),
-                    "solved": stats.get("solved"),
-                    "error": stats.get("error", "")
-                }
+    print(f"\n Resultados guardados y actualizados en '{RESULTS_DIR}'")
 
-                pd.DataFrame([nueva_fila]).to_csv(
-                    OUTPUT_FILE, mode='a', header=not os.path.exists(OUTPUT_FILE), index=False
-                )
 
-                resultados_guardados.add(clave)
+# Comprobación de parallel_a_star (python Test.py comprobar): con un solo proceso
+# tiene que expandir exactamente los mismos nodos y dar el mismo camino que a_star,
+# y con varios, un camino de la misma longitud con h_pdb (admisible).
+def comprobar_parallel_a_star():
+    from pattern_db import PatternDatabase
+    for num_tubes, num_colors, seed, nombre_h in [(6, 4, 0, "h1"), (7, 4, 1, "h1"), (7, 5, 1, "h2"), (7, 5, 2, "h_pdb")]:
+        game = WaterSortGame(num_tubes, num_colors, seed)
+        pattern_db = PatternDatabase.load_or_build(num_tubes, num_colors) if nombre_h == "h_pdb" else None
+        solver = SearchAlgorithm(game, pattern_db=pattern_db)
+        heuristic = getattr(solver, nombre_h)
+        camino, stats = solver.a_star(game.initial_state, heuristic)
+        camino_1, stats_1 = solver.parallel_a_star(game.initial_state, heuristic, num_workers=1)
+        assert stats_1["nodos_expandidos"] == stats["nodos_expandidos"], (num_tubes, num_colors, seed, nombre_h)
+        assert camino_1 == camino, (num_tubes, num_colors, seed, nombre_h)
+        if nombre_h == "h_pdb":
+            camino_4, _ = solver.parallel_a_star(game.initial_state, heuristic, num_workers=4)
+            assert len(camino_4) == len(camino), (num_tubes, num_colors, seed, nombre_h)
+        print(f"✅ {num_tubes} tubos, {num_colors} colores, semilla {seed}, {nombre_h}: "
+              f"{stats['nodos_expandidos']} nodos expandidos")
 
-            print(f"Completadas todas las pruebas para semilla {seed}.\n")
 
-print(f"\n Resultados guardados y actualizados en '{OUTPUT_FILE}'")
+if __name__ == "__main__":
+    if sys.argv[1:] == ["comprobar"]:
+        comprobar_parallel_a_star()
+    else:
+        main()
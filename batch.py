@@ -0,0 +1,135 @@
+import argparse
+import json
+import math
+import sys
+
+
+# Resolución en lote sin menús: muchas partidas en un mismo proceso y una línea JSON
+# por resultado en stdout. Se paga una sola vez el arranque del intérprete y de numpy,
+# el almacén de soluciones se abre una vez y hay un solo juego y SearchAlgorithm por
+# (tubos, colores): cada semilla solo cambia su estado inicial, así las memos de los
+# tubos, de los trasvases y de las heurísticas siguen calientes de una partida a otra.
+# Las partidas salen de --tubes/--colors/--seeds o, con --stdin, de líneas JSON
+# {"num_tubes": 8, "num_colors": 5, "seed": 3} (opcionalmente con "algoritmo").
+#
+#   python batch.py --tubes 5-8 --seeds 0-9 --algorithm BFS A*_h2 --max-seconds 60
+#   echo '{"num_tubes": 9, "num_colors": 6, "seed": 1}' | python batch.py --stdin --path
+
+
+# "5" -> [5], "5-8" -> [5, 6, 7, 8]
+def _enteros(texto):
+    inicio, _, fin = texto.partition("-")
+    return list(range(int(inicio), int(fin or inicio) + 1))
+
+
+def _aplanar(listas):
+    return [x for lista in listas for x in lista]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Resuelve partidas de Water Sort en lote y escribe una línea JSON por resultado.")
+    parser.add_argument("--tubes", type=_enteros, nargs="+", default=[[5]],
+                        help="número de tubos, o rangos como 5-12")
+    parser.add_argument("--colors", type=_enteros, nargs="+",
+                        help="número de colores (por defecto todos de 3 a tubos - 2)")
+    parser.add_argument("--seeds", type=_enteros, nargs="+", default=[[0]], help="semillas, o rangos como 0-9")
+    parser.add_argument("--algorithm", nargs="+", default=["A*_h2"],
+                        help="BFS, DFS, DLS_<límite> o A*/IDA*/Greedy/Beam con _h1, _h2, _h3 o _h_pdb")
+    parser.add_argument("--beam-width", type=int, default=100)
+    parser.add_argument("--max-seconds", type=float)
+    parser.add_argument("--max-expansions", type=int)
+    parser.add_argument("--max-frontier", type=int)
+    parser.add_argument("--packed", action="store_true", help="estados empaquetados (PackedWaterSortGame)")
+    parser.add_argument("--h-cache-size", type=int, default=0)
+    parser.add_argument("--pattern-db", action="store_true",
+                        help="cargar (o calcular) la base de datos de patrones para h_pdb")
+    parser.add_argument("--store", nargs="?", const="soluciones.sqlite",
+                        help="usar el almacén de soluciones (por defecto soluciones.sqlite)")
+    parser.add_argument("--path", action="store_true", help="incluir los movimientos de la solución")
+    parser.add_argument("--stdin", action="store_true", help="leer las partidas de stdin (una línea JSON por partida)")
+    return parser.parse_args(argv)
+
+
+# (num_tubes, num_colors, seed, algoritmos) de cada partida a resolver
+def _partidas(args):
+    if args.stdin:
+        for linea in sys.stdin:
+            if linea.strip():
+                partida = json.loads(linea)
+                algoritmos = [partida["algoritmo"]] if "algoritmo" in partida else args.algorithm
+                yield partida["num_tubes"], partida["num_colors"], partida["seed"], algoritmos
+        return
+    for num_tubes in _aplanar(args.tubes):
+        colores = _aplanar(args.colors) if args.colors else range(3, num_tubes - 1)
+        for num_colors in colores:
+            for seed in _aplanar(args.seeds):
+                yield num_tubes, num_colors, seed, args.algorithm
+
+
+# Valores que se pueden escribir en JSON estándar: los escalares de numpy pasan a
+# int/float y los float no finitos (inf, nan), que json escribiría como Infinity o
+# NaN, a None
+def _json(valor):
+    if isinstance(valor, dict):
+        return {k: _json(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [_json(v) for v in valor]
+    if hasattr(valor, "item"):
+        valor = valor.item()
+    if isinstance(valor, float) and not math.isfinite(valor):
+        return None
+    return valor
+
+
+def _escribir(fila):
+    print(json.dumps(_json(fila), allow_nan=False, default=str), flush=True)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # Se importa aquí para que --help y los errores de argumentos sean inmediatos
+    from water_sort_solver import WaterSortGame, SearchAlgorithm, SearchBudget
+    from Test import ejecutar_algoritmo, stats_fallida
+
+    store = None
+    if args.store:
+        from solution_store import SolutionStore
+        store = SolutionStore(args.store)
+    resolvedores = {}  # (num_tubes, num_colors) -> (game, solver)
+
+    try:
+        for num_tubes, num_colors, seed, algoritmos in _partidas(args):
+            fila = {"num_tubes": num_tubes, "num_colors": num_colors, "seed": seed}
+            if not 3 <= num_colors <= num_tubes - 2:
+                for algoritmo in algoritmos:
+                    stats = stats_fallida(0.0, f"colores fuera de rango (3 a {num_tubes - 2})")
+                    _escribir({**fila, "algoritmo": algoritmo, **stats})
+                continue
+
+            if (num_tubes, num_colors) not in resolvedores:
+                pattern_db = None
+                if args.pattern_db:
+                    from pattern_db import PatternDatabase
+                    pattern_db = PatternDatabase.load_or_build(num_tubes, num_colors)
+                game = WaterSortGame(num_tubes, num_colors, seed)
+                solver = SearchAlgorithm(game, packed=args.packed, h_cache_size=args.h_cache_size,
+                                         pattern_db=pattern_db)
+                resolvedores[num_tubes, num_colors] = (game, solver)
+            game, solver = resolvedores[num_tubes, num_colors]
+            game.seed = seed
+            game.initial_state = game.generate_initial_state()
+
+            for algoritmo in algoritmos:
+                budget = SearchBudget(args.max_expansions, args.max_seconds, args.max_frontier)
+                stats = ejecutar_algoritmo(game, solver, game.initial_state, algoritmo, budget, store,
+                                           beam_width=args.beam_width, con_camino=args.path)
+                _escribir({**fila, "algoritmo": algoritmo, **stats})
+    finally:
+        if store is not None:
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
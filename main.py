@@ -1,4 +1,5 @@
 from water_sort_solver import WaterSortGame, SearchAlgorithm
+from solution_store import default_store
 import numpy as np
 
 def main():
@@ -24,11 +25,14 @@ def main():
     print("  3. A*")
     print("  4. DLS (profundidad limitada)")
     print("  5. IDA* (Iterative Deepening A*)")
-    opt_alg = input("Selecciona algoritmo (1–5): ")
+    print("  6. Voraz (primero el mejor)")
+    print("  7. Beam search")
+    opt_alg = input("Selecciona algoritmo (1–7): ")
 
     algorithm = None
     heuristic = None
     depth_limit = None
+    beam_width = None
 
     if opt_alg == "1":
         algorithm = "bfs"
@@ -40,7 +44,8 @@ def main():
         print("  1. h1 (dispersión de colores)")
         print("  2. h2 (colores bien colocados)")
         print("  3. h3 (mezcla y bloqueo)")
-        opt_h = input("Selecciona heurística (1–3): ")
+        print("  4. pdb (base de datos de patrones, admisible)")
+        opt_h = input("Selecciona heurística (1–4): ")
         heuristic = opt_h
     elif opt_alg == "4":
         algorithm = "dls"
@@ -51,8 +56,26 @@ def main():
         print("  1. h1 (dispersión de colores)")
         print("  2. h2 (colores bien colocados)")
         print("  3. h3 (mezcla y bloqueo)")
+        print("  4. pdb (base de datos de patrones, admisible)")
+        opt_h = input("Selecciona heurística (1–4): ")
+        heuristic = opt_h
+    elif opt_alg == "6":
+        algorithm = "greedy"
+        print("\nHeurísticas disponibles:")
+        print("  1. h1 (dispersión de colores)")
+        print("  2. h2 (colores bien colocados)")
+        print("  3. h3 (mezcla y bloqueo)")
+        opt_h = input("Selecciona heurística (1–3): ")
+        heuristic = opt_h
+    elif opt_alg == "7":
+        algorithm = "beam"
+        print("\nHeurísticas disponibles:")
+        print("  1. h1 (dispersión de colores)")
+        print("  2. h2 (colores bien colocados)")
+        print("  3. h3 (mezcla y bloqueo)")
         opt_h = input("Selecciona heurística (1–3): ")
         heuristic = opt_h
+        beam_width = int(input("Introduce el ancho del haz: "))
     else:
         print("Opción no válida. Usando BFS por defecto.")
         algorithm = "bfs"
@@ -65,39 +88,86 @@ def main():
 
     # --- Inicialización del juego ---
     game = WaterSortGame(num_tubes, num_colors, seed)
-    solver = SearchAlgorithm(game)
+    pattern_db = None
+    if heuristic == "4" and algorithm in ("a*", "ida*"):
+        from pattern_db import PatternDatabase
+        print("\nCargando (o calculando) la base de datos de patrones...")
+        pattern_db = PatternDatabase.load_or_build(num_tubes, num_colors)
+    solver = SearchAlgorithm(game, pattern_db=pattern_db)
 
     print("\n=== Estado inicial ===")
     for i, row in enumerate(game.initial_state):
         print(f"Tubo {i}: {row.tolist()}")
 
     # --- Ejecución del algoritmo ---
+    # Búsqueda a ejecutar: nombre del método de SearchAlgorithm y sus argumentos
+    args = ()
+    kwargs = {}
     if algorithm == "bfs":
-        path, stats = solver.bfs(game.initial_state)
+        metodo = "bfs"
     elif algorithm == "dfs":
-        path, stats = solver.dfs(game.initial_state)
-    elif algorithm == "a*":
-        if heuristic == "1":
-            path, stats = solver.a_star(game.initial_state, solver.h1)
-        elif heuristic == "2":
-            path, stats = solver.a_star(game.initial_state, solver.h2)
-        elif heuristic == "3":
-            path, stats = solver.a_star(game.initial_state, solver.h3)
-        else:
+        metodo = "dfs"
+    elif algorithm in ("a*", "ida*"):
+        metodo = "a_star" if algorithm == "a*" else "ida_star"
+        heuristics = {"1": solver.h1, "2": solver.h2, "3": solver.h3, "4": solver.h_pdb}
+        if heuristic not in heuristics:
             print("Heurística no válida. Usando h1 por defecto.")
-            path, stats = solver.a_star(game.initial_state, solver.h1)
+            heuristic = "1"
+        args = (heuristics[heuristic],)
     elif algorithm == "dls":
-        path, stats = solver.dls(game.initial_state, depth_limit)
-    elif algorithm == "ida*":
-        if heuristic == "1":
-            path, stats = solver.ida_star(game.initial_state, solver.h1)
-        elif heuristic == "2":
-            path, stats = solver.ida_star(game.initial_state, solver.h2)
-        elif heuristic == "3":
-            path, stats = solver.ida_star(game.initial_state, solver.h3)
-        else:
+        metodo = "dls"
+        args = (depth_limit,)
+    elif algorithm in ("greedy", "beam"):
+        heuristics = {"1": solver.h1, "2": solver.h2, "3": solver.h3}
+        if heuristic not in heuristics:
             print("Heurística no válida. Usando h1 por defecto.")
-            path, stats = solver.ida_star(game.initial_state, solver.h1)
+            heuristic = "1"
+        args = (heuristics[heuristic],)
+        if algorithm == "greedy":
+            metodo = "greedy_best_first"
+        else:
+            metodo = "beam_search"
+            kwargs = {"width": beam_width}
+
+    # Si esta partida ya se resolvió con el mismo algoritmo, se lee del almacén
+    # (poner WATERSORT_NO_STORE=1 para no usarlo). El nombre es el mismo que en
+    # Test.py y batch.py, con la heurística que se usa de verdad.
+    nombres = {"bfs": "BFS", "dfs": "DFS", "a*": "A*", "dls": "DLS", "ida*": "IDA*",
+               "greedy": "Greedy", "beam": "Beam"}
+    nombres_h = {"1": "h1", "2": "h2", "3": "h3", "4": "h_pdb"}
+    nombre = nombres[algorithm]
+    if heuristic is not None:
+        nombre += f"_{nombres_h[heuristic]}"
+    if depth_limit is not None:
+        nombre += f"_{depth_limit}"
+    if beam_width is not None:
+        nombre += f"_w{beam_width}"
+    store = default_store()
+    guardado = store.get(solver, game.initial_state, nombre) if store is not None else None
+
+    if guardado is not None:
+        path, stats = guardado
+    else:
+        # Se muestra el progreso de la búsqueda cada segundo; Ctrl+C la para
+        print("\nBuscando... (Ctrl+C para parar)")
+        try:
+            for evento in solver.progress_events(metodo, game.initial_state, *args, interval=1.0, **kwargs):
+                if evento["evento"] == "fin":
+                    path, stats = evento["camino"], evento["stats"]
+                else:
+                    cota = "" if evento["cota"] is None else f" | cota {evento['cota']}"
+                    print(f"  {evento['tiempo_seg']:.0f} s | {evento['nodos_expandidos']} nodos expandidos"
+                          f" | frontera {evento['frontera']}{cota} | {evento['nodos_por_seg']:.0f} nodos/s")
+        except KeyboardInterrupt:
+            print("\nBúsqueda cancelada.")
+            if store is not None:
+                store.close()
+            return
+
+    if store is not None:
+        if guardado is None:
+            store.put(solver, game.initial_state, nombre, path, stats)
+        store.close()
 
     # --- Resultados ---
     print("\n=== RESULTADOS ===")
@@ -0,0 +1,134 @@
+from collections import deque
+from itertools import combinations
+import os
+import struct
+import numpy as np
+from water_sort_solver import VisitedTable
+
+
+DEFAULT_DIR = "pdb"
+
+
+class PatternDatabase:
+    # Heurística de base de datos de patrones. Se sigue solo a pattern_size colores
+    # (el patrón, con etiquetas 1..pattern_size) y el resto de colores se ven como uno
+    # solo, X = pattern_size + 1. En ese problema abstracto los trasvases son
+    # relajados: se puede verter cualquier cantidad entre 1 y lo que cabe del bloque
+    # de arriba. Así todo movimiento real es también un movimiento abstracto y la
+    # distancia abstracta a la meta es una cota admisible.
+    # La tabla se calcula una vez por (num_tubes, num_colors, pattern_size) con una
+    # BFS hacia atrás desde la única meta abstracta, recorriendo todo el espacio
+    # abstracto. Se guarda en una VisitedTable (clave canónica abstracta -> distancia)
+    # que se abre con np.memmap, así consultar es O(1) y cargarla no cuesta nada.
+    # Como todos los colores son iguales para la abstracción, la misma tabla sirve
+    # para cualquier grupo de pattern_size colores: value() da el máximo sobre todos.
+    # El espacio abstracto crece muy deprisa con pattern_size: con 1 son unos 10^4
+    # estados para 12 tubos; con 2 ya no cabe en memoria a partir de 8 tubos.
+    def __init__(self, num_tubes, num_colors, pattern_size, table, directorio=None, capacity=4):
+        self.num_tubes = num_tubes
+        self.num_colors = num_colors
+        self.pattern_size = pattern_size
+        self.capacity = capacity
+        self.table = table
+        self.directorio = directorio
+        self._key_struct = struct.Struct(">%dH" % num_tubes)
+        self.patrones = list(combinations(range(1, num_colors + 1), pattern_size))
+        self._abstract_cache = {}  # (contenido del tubo, índice del patrón) -> valor abstracto
+
+    @classmethod
+    def build(cls, num_tubes, num_colors, pattern_size=1, capacity=4):
+        x = pattern_size + 1
+        meta = tuple(sorted([(c,) * capacity for c in range(1, pattern_size + 1)]
+                            + [(x,) * capacity] * (num_colors - pattern_size)
+                            + [()] * (num_tubes - num_colors)))
+
+        # BFS hacia atrás con movimientos inversos: se devuelven k unidades del color
+        # de arriba de j a cualquier tubo i con sitio. Como el trasvase original
+        # acababa en un tubo vacío o con ese color arriba, lo que queda en j tiene que
+        # ser vacío o seguir empezando por ese color.
+        distancia = {meta: 0}
+        abiertos = deque([meta])
+        while abiertos:
+            estado = abiertos.popleft()
+            d = distancia[estado] + 1
+            for j, tj in enumerate(estado):
+                if not tj:
+                    continue
+                color = tj[0]
+                bloque = 1
+                while bloque < len(tj) and tj[bloque] == color:
+                    bloque += 1
+                for i, ti in enumerate(estado):
+                    if i == j:
+                        continue
+                    for k in range(1, min(bloque, capacity - len(ti)) + 1):
+                        if k == bloque and len(tj) != bloque:
+                            continue
+                        nuevo = list(estado)
+                        nuevo[i] = (color,) * k + ti
+                        nuevo[j] = tj[k:]
+                        nuevo = tuple(sorted(nuevo))
+                        if nuevo not in distancia:
+                            distancia[nuevo] = d
+                            abiertos.append(nuevo)
+
+        key_struct = struct.Struct(">%dH" % num_tubes)
+        table = VisitedTable(key_struct.size, capacity=2 * len(distancia), values=True)
+        for estado, d in distancia.items():
+            table[key_struct.pack(*sorted(_value_of(t) for t in estado))] = d
+        return cls(num_tubes, num_colors, pattern_size, table, capacity=capacity)
+
+    def save(self, directorio):
+        self.table.save(directorio)
+        np.save(os.path.join(directorio, "patron.npy"),
+                np.array([self.num_tubes, self.num_colors, self.pattern_size, self.capacity], dtype=np.int64))
+        self.directorio = directorio
+
+    @classmethod
+    def load(cls, directorio):
+        num_tubes, num_colors, pattern_size, capacity = np.load(os.path.join(directorio, "patron.npy")).tolist()
+        return cls(num_tubes, num_colors, pattern_size, VisitedTable.load(directorio), directorio, capacity)
+
+    # Abre la tabla de disco si ya existe y si no la calcula y la guarda
+    @classmethod
+    def load_or_build(cls, num_tubes, num_colors, pattern_size=1, directorio=None):
+        if directorio is None:
+            directorio = default_path(num_tubes, num_colors, pattern_size)
+        if not os.path.exists(os.path.join(directorio, "patron.npy")):
+            cls.build(num_tubes, num_colors, pattern_size).save(directorio)
+        return cls.load(directorio)
+
+    def _abstract_value(self, contents, indice):
+        valor = self._abstract_cache.get((contents, indice))
+        if valor is None:
+            patron = self.patrones[indice]
+            x = self.pattern_size + 1
+            valor = _value_of([patron.index(c) + 1 if c in patron else x for c in contents])
+            self._abstract_cache[(contents, indice)] = valor
+        return valor
+
+    # Máximo, sobre todos los grupos de colores, de la distancia abstracta a la meta.
+    # Si un estado abstracto no está en la tabla es que ni siquiera con los trasvases
+    # relajados se llega a la meta: el estado no tiene solución (infinito).
+    def value(self, game, state):
+        contents = [game.tube_contents_of(v) for v in game.tube_values(state)]
+        mejor = 0
+        for indice in range(len(self.patrones)):
+            values = sorted(self._abstract_value(t, indice) for t in contents)
+            d = self.table.get(self._key_struct.pack(*values))
+            if d is None:
+                return float('inf')
+            mejor = max(mejor, d)
+        return mejor
+
+
+def default_path(num_tubes, num_colors, pattern_size=1):
+    return os.path.join(DEFAULT_DIR, "pdb_%d_%d_%d" % (num_tubes, num_colors, pattern_size))
+
+
+# valor de un tubo (4 bits por casilla, contenido pegado abajo) como en WaterSortGame
+def _value_of(contents):
+    value = 0
+    for c in contents:
+        value = (value << 4) | c
+    return value
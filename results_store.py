@@ -0,0 +1,115 @@
+import glob
+import importlib.util
+import os
+import time
+
+
+DEFAULT_DIR = "resultados_pruebas"
+KEY_COLUMNS = ["num_tubes", "num_colors", "seed", "algoritmo"]
+BUFFER_ROWS = 1000
+FLUSH_SECONDS = 60
+
+
+class ResultsStore:
+    # Resultados de Test.py guardados por partes en una carpeta: las filas se acumulan
+    # en memoria y se escriben de golpe en un fichero nuevo (parte-*.parquet, o
+    # parte-*.csv si no está pyarrow) cada buffer_rows filas o cada flush_seconds
+    # segundos, así guardar una fila no obliga a reescribir ni a releer nada.
+    # Cada parte puede tener sus propias columnas (perfil_*, memoria_pico_*...);
+    # load_results las junta. legacy_csv es el CSV de antes de tener partes: sus
+    # filas cuentan para reanudar y se cargan junto con las partes.
+    def __init__(self, directorio=DEFAULT_DIR, buffer_rows=BUFFER_ROWS, flush_seconds=FLUSH_SECONDS,
+                 legacy_csv=None):
+        self.directorio = directorio
+        self.buffer_rows = buffer_rows
+        self.flush_seconds = flush_seconds
+        self.legacy_csv = legacy_csv
+        self.formato = "parquet" if importlib.util.find_spec("pyarrow") is not None else "csv"
+        self.buffer = []
+        self._ultimo_volcado = time.time()
+        self._partes_escritas = 0
+        os.makedirs(directorio, exist_ok=True)
+
+    # Claves (num_tubes, num_colors, seed, algoritmo) ya guardadas, leyendo solo esas
+    # columnas de cada parte
+    def keys(self):
+        claves = set()
+        for df in _read_all(self.directorio, self.legacy_csv, KEY_COLUMNS):
+            claves.update(tuple(fila) for fila in df[KEY_COLUMNS].itertuples(index=False))
+        claves.update(tuple(fila[k] for k in KEY_COLUMNS) for fila in self.buffer)
+        return claves
+
+    def append(self, fila):
+        self.buffer.append(fila)
+        if len(self.buffer) >= self.buffer_rows or time.time() - self._ultimo_volcado >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        self._ultimo_volcado = time.time()
+        if not self.buffer:
+            return
+        import pandas as pd
+        df = pd.DataFrame(self.buffer)
+        # el nombre lleva el momento y el pid para que varios procesos no se pisen
+        self._partes_escritas += 1
+        nombre = "parte-%d-%d-%d.%s" % (time.time_ns(), os.getpid(), self._partes_escritas, self.formato)
+        ruta = os.path.join(self.directorio, nombre)
+        # se escribe con otro nombre y se renombra: nunca queda una parte a medias
+        temporal = ruta + ".tmp"
+        if self.formato == "parquet":
+            df.to_parquet(temporal, index=False)
+        else:
+            df.to_csv(temporal, index=False)
+        os.replace(temporal, ruta)
+        self.buffer = []
+
+    # Junta todas las partes en una sola, para que cargar no dependa de cuántas
+    # tandas se hayan escrito
+    def compact(self):
+        self.flush()
+        partes = _parts(self.directorio)
+        if len(partes) <= 1:
+            return
+        import pandas as pd
+        df = pd.concat([_read_part(p) for p in partes], ignore_index=True)
+        self.buffer = df.to_dict("records")
+        self.flush()
+        for parte in partes:
+            os.remove(parte)
+
+    def close(self):
+        self.flush()
+
+    def __len__(self):
+        return len(self.keys())
+
+
+def _parts(directorio):
+    return sorted(glob.glob(os.path.join(directorio, "parte-*.parquet"))
+                  + glob.glob(os.path.join(directorio, "parte-*.csv")))
+
+
+def _read_part(ruta, columns=None):
+    import pandas as pd
+    if ruta.endswith(".parquet"):
+        return pd.read_parquet(ruta, columns=columns)
+    return pd.read_csv(ruta, usecols=columns)
+
+
+def _read_all(directorio, legacy_csv=None, columns=None):
+    import pandas as pd
+    tablas = []
+    if legacy_csv is not None and os.path.exists(legacy_csv):
+        tablas.append(pd.read_csv(legacy_csv, usecols=columns))
+    tablas.extend(_read_part(p, columns) for p in _parts(directorio))
+    return tablas
+
+
+# Todos los resultados (partes y CSV antiguo) en un DataFrame; columns para leer solo
+# esas columnas (en Parquet ni se leen las demás)
+def load_results(directorio=DEFAULT_DIR, legacy_csv=None, columns=None):
+    import pandas as pd
+    tablas = _read_all(directorio, legacy_csv, columns)
+    if not tablas:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(tablas, ignore_index=True)
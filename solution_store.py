@@ -0,0 +1,129 @@
+import json
+import os
+import sqlite3
+import time
+
+
+DEFAULT_PATH = "soluciones.sqlite"
+MAX_BYTES = 256 * 1024 * 1024
+
+
+class SolutionStore:
+    # Soluciones ya calculadas guardadas en SQLite. La clave es el estado inicial
+    # canónico (canonical_key, que no depende del orden de los tubos), el nombre del
+    # algoritmo (como en Test.py: "BFS", "A*_h2"...) y las opciones del
+    # SearchAlgorithm, así dos semillas que dan el mismo puzle con los tubos en otro
+    # orden comparten la solución.
+    # Los movimientos se guardan en el orden canónico de los tubos y al leerlos se
+    # pasan a los índices de la partida que se consulta.
+    # Si la base de datos pasa de max_bytes se borran las soluciones usadas hace más
+    # tiempo. Las búsquedas paradas por un SearchBudget no se guardan.
+    def __init__(self, path=DEFAULT_PATH, max_bytes=MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        # timeout alto: en Test.py escriben varios procesos a la vez
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS soluciones ("
+            " clave BLOB NOT NULL,"
+            " algoritmo TEXT NOT NULL,"
+            " opciones TEXT NOT NULL,"
+            " camino TEXT,"
+            " stats TEXT NOT NULL,"
+            " ultimo_uso REAL NOT NULL,"
+            " PRIMARY KEY (clave, algoritmo, opciones))"
+        )
+        self.conn.commit()
+
+    # (clave canónica, orden) donde orden[k] es el tubo de esta partida que ocupa la
+    # posición k en el orden canónico
+    def _clave(self, solver, initial_state):
+        game = solver.game
+        estado = game.encode(initial_state)
+        values = game.tube_values(estado)
+        orden = sorted(range(len(values)), key=values.__getitem__)
+        return game.canonical_key(estado), orden
+
+    # también profile y measure_memory: sus stats llevan columnas que las demás no tienen
+    def _opciones(self, solver):
+        opciones = dict(solver._opciones, profile=solver.profile, measure_memory=solver.measure_memory)
+        return json.dumps(opciones, sort_keys=True)
+
+    # (camino, stats) guardados para esta partida, o None
+    def get(self, solver, initial_state, algoritmo):
+        clave, orden = self._clave(solver, initial_state)
+        fila = self.conn.execute(
+            "SELECT camino, stats FROM soluciones WHERE clave = ? AND algoritmo = ? AND opciones = ?",
+            (clave, algoritmo, self._opciones(solver)),
+        ).fetchone()
+        if fila is None:
+            return None
+        self.conn.execute(
+            "UPDATE soluciones SET ultimo_uso = ? WHERE clave = ? AND algoritmo = ? AND opciones = ?",
+            (time.time(), clave, algoritmo, self._opciones(solver)),
+        )
+        self.conn.commit()
+
+        camino = None
+        if fila[0] is not None:
+            camino = [(orden[i], orden[j]) for i, j in json.loads(fila[0])]
+        stats = json.loads(fila[1])
+        stats["desde_almacen"] = True
+        return camino, stats
+
+    def put(self, solver, initial_state, algoritmo, camino, stats):
+        if stats.get("status") == "budget":
+            return
+        clave, orden = self._clave(solver, initial_state)
+        posicion = {tubo: k for k, tubo in enumerate(orden)}
+        camino_canonico = None
+        # bfs y dfs devuelven los cerrados si no hay solución: eso no se guarda
+        if isinstance(camino, list):
+            camino_canonico = json.dumps([(posicion[i], posicion[j]) for i, j in camino])
+        stats = {k: v for k, v in stats.items() if k != "desde_almacen"}
+        self.conn.execute(
+            "INSERT OR REPLACE INTO soluciones VALUES (?, ?, ?, ?, ?, ?)",
+            (clave, algoritmo, self._opciones(solver), camino_canonico,
+             json.dumps(stats, default=str), time.time()),
+        )
+        self.conn.commit()
+        self._evict()
+
+    # bytes ocupados de verdad (sin contar las páginas libres)
+    def size_bytes(self):
+        paginas = self.conn.execute("PRAGMA page_count").fetchone()[0]
+        libres = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        tam_pagina = self.conn.execute("PRAGMA page_size").fetchone()[0]
+        return (paginas - libres) * tam_pagina
+
+    # Borra un 10% de las filas (las usadas hace más tiempo) hasta quedar por debajo
+    # de max_bytes
+    def _evict(self):
+        while self.max_bytes is not None and self.size_bytes() > self.max_bytes:
+            total = self.conn.execute("SELECT COUNT(*) FROM soluciones").fetchone()[0]
+            if not total:
+                break
+            self.conn.execute(
+                "DELETE FROM soluciones WHERE rowid IN"
+                " (SELECT rowid FROM soluciones ORDER BY ultimo_uso LIMIT ?)",
+                (max(1, total // 10),),
+            )
+            self.conn.commit()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM soluciones").fetchone()[0]
+
+    def clear(self):
+        self.conn.execute("DELETE FROM soluciones")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+# Almacén por defecto, o None si la variable de entorno WATERSORT_NO_STORE está
+# puesta (para no leer ni guardar soluciones sin tocar el código)
+def default_store(path=DEFAULT_PATH):
+    if os.environ.get("WATERSORT_NO_STORE"):
+        return None
+    return SolutionStore(path)
@@ -1,8 +1,23 @@
-from collections import deque
+from array import array
+from collections import OrderedDict, deque
+from itertools import permutations, product
 import heapq
+import multiprocessing as mp
+import os
+import queue
+import shutil
+import struct
+import tempfile
+import threading
 import time
+import tracemalloc
 import numpy as np
 import random
+import zlib
+
+
+# Entradas de la memo de _fold_colors (LRU)
+FOLD_CACHE_SIZE = 1 << 18
 
 
 class WaterSortGame:
@@ -11,7 +26,20 @@ class WaterSortGame:
             self.num_colors = num_colors
             self.capacity = 4
             self.seed = seed
+            self._init_tables()
             self.initial_state = self.generate_initial_state()
+
+    def _init_tables(self):
+        # cada tubo se puede ver como un int de 4 bits por casilla (la casilla 0,
+        # la de arriba, es el nibble más significativo)
+        self.tube_bits = 4 * self.capacity
+        self.tube_mask = (1 << self.tube_bits) - 1
+        self._weights = 16 ** np.arange(self.capacity - 1, -1, -1)
+        self._contents_cache = {}
+        self._info_cache = {}
+        self._pour_cache = {}
+        self._fold_cache = HeuristicCache(FOLD_CACHE_SIZE)
+        self._key_struct = struct.Struct(">%d%s" % (self.num_tubes, "H" if self.tube_bits <= 16 else "Q"))
     def generate_initial_state(self):
         if self.seed is not None:
             random.seed(self.seed)
@@ -98,6 +126,82 @@ class WaterSortGame:
         sorted_tubes = tuple(sorted(state_tuple))
         return hash(sorted_tubes)
 
+    # Clave exacta (sin colisiones) e invariante a permutar tubos: los tubos como int,
+    # ordenados y empaquetados en bytes. Con fold_colors se renombran antes los colores
+    # para que dos estados iguales salvo cambio de colores den la misma clave.
+    # fold_colors cuesta: cada clave nueva prueba hasta 120 renombrados, y aun con la
+    # memo de _fold_colors un BFS de 7 tubos, 4 colores, semilla 1 va el doble de lento
+    # (0,74 s frente a 0,37 s) para quitar solo un 18% de estados (2495 frente a
+    # 3061). Además, si hay más de 120 renombrados empatados se desempata por el orden
+    # de los tubos ordenados y la clave deja de ser canónica: dos estados equivalentes
+    # pueden dar claves distintas (nunca al revés, la clave siempre es la de un
+    # renombrado del propio estado), así que solo se pierde algún duplicado.
+    def canonical_key(self, state, fold_colors=False):
+        values = self.tube_values(state)
+        if fold_colors:
+            values = self._fold_colors(values)
+        values.sort()
+        return self._key_struct.pack(*values)
+
+    def _fold_colors(self, values):
+        # memo por multiconjunto de tubos: el resultado no depende del orden de los
+        # tubos (se trabaja sobre los valores ya ordenados)
+        values = tuple(sorted(values))
+        mejor = self._fold_cache.get(values)
+        if mejor is None:
+            mejor = self._fold_sorted(values)
+            self._fold_cache.put(values, mejor)
+        return list(mejor)
+
+    def _fold_sorted(self, values):
+        contents = [self.tube_contents_of(v) for v in values]
+
+        # firma de cada color que no depende ni del orden de los tubos ni del nombre
+        # de los colores: (altura del tubo, casillas que ocupa) en cada tubo donde está
+        firma = {}
+        for t in contents:
+            for c in set(t):
+                mask = 0
+                for k, x in enumerate(t):
+                    if x == c:
+                        mask |= 1 << k
+                firma.setdefault(c, []).append((len(t), mask))
+        firma = {c: tuple(sorted(f)) for c, f in firma.items()}
+
+        # refinamiento: cada tubo del color visto con el rango de sus vecinos
+        rango = {f: r for r, f in enumerate(sorted(set(firma.values())))}
+        firma2 = {}
+        for t in contents:
+            for c in set(t):
+                firma2.setdefault(c, []).append(tuple(-1 if x == c else rango[firma[x]] for x in t))
+        clases = {}
+        for c in firma:
+            clases.setdefault((firma[c], tuple(sorted(firma2[c]))), []).append(c)
+        grupos = [clases[k] for k in sorted(clases)]
+
+        # si quedan empates se prueban todas las asignaciones (mientras sean pocas)
+        # y nos quedamos con la menor, así la clave es la misma para cualquier
+        # renombrado; si hay demasiadas, se desempata por orden de aparición
+        n_asignaciones = 1
+        for g in grupos:
+            for k in range(2, len(g) + 1):
+                n_asignaciones *= k
+        if n_asignaciones > 120:
+            opciones = [grupos]
+        else:
+            opciones = product(*[permutations(g) for g in grupos])
+
+        mejor = None
+        for opcion in opciones:
+            nuevo = {}
+            for g in opcion:
+                for c in g:
+                    nuevo[c] = len(nuevo) + 1
+            relabeled = sorted(self._value_of([nuevo[x] for x in t]) for t in contents)
+            if mejor is None or relabeled < mejor:
+                mejor = relabeled
+        return mejor
+
     
     def _contents_left(self, row):
         # todos los números q no sean 0 izq -> der
@@ -121,18 +225,136 @@ class WaterSortGame:
         arr = [0] * (self.capacity - len(contents)) + contents
         return np.array(arr, dtype=int)
 
-    def get_valid_moves(self, state):
+    # Genera los movimientos a partir del resumen de cada tubo: los destinos se
+    # agrupan por color de arriba, así cada origen solo mira los tubos con su
+    # mismo color (y los vacíos) en vez de comprobar las n*(n-1) parejas.
+    # El orden de los movimientos es el mismo que recorriendo i, j.
+    #
+    # Con prune=True se quitan los movimientos que nunca hacen falta en un camino
+    # óptimo (BFS y A* siguen encontrando la misma longitud):
+    #   - verter un tubo de un solo color (completo o no) en un tubo vacío, que
+    #     solo cambia el orden de los tubos; un tubo completo no tiene otro destino
+    #   - verter en más de un tubo vacío, ya que todos los vacíos son iguales
+    #   - deshacer last_move: o vuelve al estado padre o llega a un estado al que
+    #     el padre ya llegaba en un solo movimiento
+    def get_valid_moves(self, state, summary=None, prune=False, last_move=None):
+        if summary is None:
+            summary = self.tube_summary(state)
+        vacios = []
+        por_color = {}  # color de arriba -> [(tubo, huecos)] de los tubos con sitio
+        for j, (top, block, free, complete, empty) in enumerate(summary):
+            if empty:
+                vacios.append(j)
+            elif free:
+                por_color.setdefault(top, []).append((j, free))
+        if prune:
+            vacios = vacios[:1]
+
         moves = []
-        #recorremos todos los tubos del estado, como origen
-        for i in range(self.num_tubes):
-            for j in range(self.num_tubes): #recorremos todos los tubos del estado, como destino
-                if i == j:
-                    continue #si son =, saltamos al siguiente j sin hacer nada.
-                k = self.is_valid_state(state[i], state[j])
-                if k != -1:
-                    moves.append((i, j))
+        for i, (top, block, free, complete, empty) in enumerate(summary):
+            if empty or (prune and complete):
+                continue
+            destinos = [j for j, huecos in por_color.get(top, ()) if j != i and block <= huecos]
+            if vacios and not (prune and block + free == self.capacity):
+                destinos = sorted(destinos + vacios)
+            for j in destinos:
+                if prune and last_move is not None and (j, i) == last_move:
+                    continue
+                moves.append((i, j))
         return moves
 
+    # Resumen de un tubo (dado como int): (color de arriba, longitud del bloque de
+    # arriba, huecos libres, completo, vacío). Se calcula una vez por valor de tubo,
+    # así el resumen de un estado (tube_summary) son num_tubes consultas a la memo.
+    # Las búsquedas con cola lo rehacen en cada expansión en vez de guardarlo con cada
+    # nodo de abiertos (costaría memoria por nodo); el IDA* de memory_light sí lo
+    # actualiza en el sitio solo en los dos tubos de cada movimiento.
+    def tube_info(self, value):
+        info = self._info_cache.get(value)
+        if info is None:
+            contents = self.tube_contents_of(value)
+            block = self._top_block_len(contents)
+            free = self.capacity - len(contents)
+            info = (contents[0] if contents else 0, block, free,
+                    block == self.capacity, not contents)
+            self._info_cache[value] = info
+        return info
+
+    def tube_summary(self, state):
+        return [self.tube_info(v) for v in self.tube_values(state)]
+
+    def tube_value(self, state, i):
+        return int(np.asarray(state)[i] @ self._weights)
+
+    # resultado de verter el tubo vi sobre vj (ambos como int), memorizado
+    def _pour(self, vi, vj):
+        res = self._pour_cache.get((vi, vj))
+        if res is None:
+            src = self.tube_contents_of(vi)
+            dst = self.tube_contents_of(vj)
+            block = self._top_block_len(src)
+            res = (self._value_of(src[block:]), self._value_of(src[:block] + dst))
+            self._pour_cache[(vi, vj)] = res
+        return res
+
+    # fila de la matriz (con ceros arriba) de un tubo dado como int
+    def tube_row(self, value):
+        contents = self.tube_contents_of(value)
+        return (0,) * (self.capacity - len(contents)) + contents
+
+    # Matriz (k, num_tubes, capacity) con los k hijos de `state`, construida copiando
+    # el padre y cambiando solo los dos tubos de cada movimiento.
+    def children_array(self, state, moves, children):
+        batch = np.repeat(self.decode(state)[None], len(moves), axis=0)
+        for k, ((i, j), child) in enumerate(zip(moves, children)):
+            batch[k, i] = self.tube_row(self.tube_value(child, i))
+            batch[k, j] = self.tube_row(self.tube_value(child, j))
+        return batch
+
+    # Conversión entre la representación que usa cada juego y la matriz numpy
+    def encode(self, state):
+        return np.array(state, dtype=int)
+
+    def decode(self, state):
+        return np.array(state, dtype=int)
+
+    # Valor (int) de cada tubo. Una lista de ints ya son valores de tubos: es como el
+    # IDA* de poca memoria guarda el estado que modifica en el sitio.
+    def tube_values(self, state):
+        if isinstance(state, list) and state and isinstance(state[0], int):
+            return list(state)
+        return (np.asarray(state) @ self._weights).tolist()
+
+    def from_tube_values(self, values):
+        return np.array([self.tube_row(v) for v in values], dtype=int)
+
+    # Un estado (con los tubos en el orden de la clave) a partir de una clave de
+    # canonical_key
+    def state_from_key(self, key):
+        return self.from_tube_values(list(self._key_struct.unpack(key)))
+
+    # contenido (sin ceros, de arriba a abajo) de un tubo dado como int
+    def tube_contents_of(self, value):
+        contents = self._contents_cache.get(value)
+        if contents is None:
+            contents = []
+            v = value
+            while v:
+                contents.append(v & 0xF)
+                v >>= 4
+            contents = tuple(reversed(contents))
+            self._contents_cache[value] = contents
+        return contents
+
+    def tube_contents(self, state):
+        return [self.tube_contents_of(v) for v in self.tube_values(state)]
+
+    def _value_of(self, contents):
+        value = 0
+        for c in contents:
+            value = (value << 4) | c
+        return value
+
     def apply_move(self, state, move):
         state = np.array(state, dtype=int)  
         i, j = move
@@ -160,271 +382,1470 @@ class WaterSortGame:
     
 
 
-class SearchAlgorithm:
+class PackedWaterSortGame(WaterSortGame):
+    # Misma partida pero cada estado es un único int de Python: el tubo i ocupa los
+    # bits [i*tube_bits, (i+1)*tube_bits). Evita las matrices numpy pequeñas por nodo.
     def __init__(self, game):
-        self.game = game
+        self.num_tubes = game.num_tubes
+        self.num_colors = game.num_colors
+        self.capacity = game.capacity
+        self.seed = game.seed
+        self._init_tables()
+        # tubos que valen como objetivo: vacíos o llenos de un solo color
+        self._goal_tubes = {0} | {self._value_of([c] * self.capacity) for c in range(1, 16)}
+        self.initial_state = self.encode(game.initial_state)
+
+    def encode(self, state):
+        if isinstance(state, int):
+            return state
+        return self.from_tube_values(WaterSortGame.tube_values(self, state))
+
+    def decode(self, state):
+        rows = []
+        for contents in self.tube_contents(state):
+            rows.append([0] * (self.capacity - len(contents)) + list(contents))
+        return np.array(rows, dtype=int)
+
+    def tube_values(self, state):
+        if isinstance(state, list):
+            return list(state)
+        bits, mask = self.tube_bits, self.tube_mask
+        return [(state >> (i * bits)) & mask for i in range(self.num_tubes)]
+
+    def from_tube_values(self, values):
+        packed = 0
+        for i, value in enumerate(values):
+            packed |= value << (i * self.tube_bits)
+        return packed
+
+    def is_goal_state(self, state):
+        goal = self._goal_tubes
+        return all(v in goal for v in self.tube_values(state))
+
+    def tube_value(self, state, i):
+        return (state >> (i * self.tube_bits)) & self.tube_mask
 
-    def bfs(self, initial_state):
+    def apply_move(self, state, move):
+        i, j = move
+        bits, mask = self.tube_bits, self.tube_mask
+        vi = (state >> (i * bits)) & mask
+        vj = (state >> (j * bits)) & mask
+        new_vi, new_vj = self._pour(vi, vj)
+        return state ^ ((vi ^ new_vi) << (i * bits)) ^ ((vj ^ new_vj) << (j * bits))
+
+
+class SearchBudget:
+    # Límites opcionales para cualquier búsqueda: número de nodos expandidos,
+    # segundos y tamaño de la frontera. cancel() (p. ej. desde otro hilo) para la
+    # búsqueda en el siguiente nodo. Al pararse, la búsqueda devuelve None y unas
+    # estadísticas parciales con status 'budget'.
+    # También sirve para seguir la búsqueda en vivo: si hay on_progress, cada
+    # progress_interval segundos se le llama con un evento (ver progress_event). Si
+    # devuelve False la búsqueda se para como con cancel(). Sin on_progress no cuesta
+    # nada más que la comprobación de los límites.
+    def __init__(self, max_expansions=None, max_seconds=None, max_frontier=None,
+                 on_progress=None, progress_interval=1.0):
+        self.max_expansions = max_expansions
+        self.max_seconds = max_seconds
+        self.max_frontier = max_frontier
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+        self.cancelled = False
+        self._proximo_aviso = None
+
+    def cancel(self):
+        self.cancelled = True
+
+    # Evento de progreso: nodos expandidos, tamaño de la frontera, cota actual (la f
+    # mínima de abiertos en A*/ARA*, la h en voraz, el umbral en IDA*, la profundidad
+    # en beam/DLS/BFS por niveles; None si la búsqueda no la tiene) y nodos por segundo
+    @staticmethod
+    def progress_event(t0, expansions, frontier, cota=None):
+        tiempo = time.time() - t0
+        return {
+            "nodos_expandidos": expansions,
+            "frontera": frontier,
+            "cota": cota,
+            "tiempo_seg": tiempo,
+            "nodos_por_seg": expansions / tiempo if tiempo > 0 else 0.0,
+        }
+
+    # nombre del límite superado, o None
+    def exceeded(self, t0, expansions, frontier, cota=None):
+        if self.on_progress is not None:
+            ahora = time.time()
+            if self._proximo_aviso is None:
+                self._proximo_aviso = t0 + self.progress_interval
+            if ahora >= self._proximo_aviso:
+                self._proximo_aviso = ahora + self.progress_interval
+                if self.on_progress(self.progress_event(t0, expansions, frontier, cota)) is False:
+                    self.cancelled = True
+        if self.cancelled:
+            return 'cancel'
+        if self.max_expansions is not None and expansions >= self.max_expansions:
+            return 'max_expansions'
+        if self.max_frontier is not None and frontier > self.max_frontier:
+            return 'max_frontier'
+        if self.max_seconds is not None and time.time() - t0 >= self.max_seconds:
+            return 'max_seconds'
+        return None
+
+
+class _BudgetExceeded(Exception):
+    def __init__(self, limite):
+        super().__init__(limite)
+        self.limite = limite
+
+
+class HeuristicCache:
+    # Memo acotada de valores de heurística: como mucho max_size entradas y, al
+    # llenarse, se expulsa la usada hace más tiempo (LRU).
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        valor = self.data.get(key)
+        if valor is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.data.move_to_end(key)
+        return valor
+
+    def put(self, key, valor):
+        self.data[key] = valor
+        self.data.move_to_end(key)
+        if len(self.data) > self.max_size:
+            self.data.popitem(last=False)
+
+    def __len__(self):
+        return len(self.data)
+
+
+class VisitedTable:
+    # Tabla hash de direccionamiento abierto (sondeo lineal) para claves canónicas de
+    # tamaño fijo, sobre arrays numpy preasignados: cada clave ocupa unos pocos uint64,
+    # más un uint8 con el estado de la casilla y, con values=True, un int32 de valor
+    # (g). Al pasar de 2/3 de casillas usadas se rehace con el doble de sitio.
+    # Los arrays numpy comparten memoria con bytearrays, que son los que se leen y
+    # escriben casilla a casilla (indexar numpy desde Python es mucho más lento).
+    # Se usa como un set (in, add, discard, len, for) o como un dict clave -> int
+    # ([], []=, get), así sustituye a cerrados, visitados o g_cost sin tocar nada más.
+    # El hash es crc32 (el mismo en todos los procesos), así que la tabla se puede
+    # guardar con save y abrir con load sin rehacerla, incluso con np.memmap.
+    # No llega a "unos pocos bytes" por estado: la clave canónica exacta ya son 2
+    # bytes por tubo (24 con 12 tubos) y con la ocupación entre 1/3 y 2/3 salen unos
+    # 44-66 bytes por estado, frente a 85-99 de un set de bytes. Como el sondeo se
+    # hace en Python, insertar es unas 20 veces más lento que en un set, así que las
+    # búsquedas solo la usan con compact_tables=True (y las tablas de pattern_db).
+    LIBRE, OCUPADA, BORRADA = 0, 1, 2
+
+    def __init__(self, key_size, capacity=1024, values=False):
+        self.key_size = key_size
+        self._words = -(-key_size // 8)
+        self._tam = 8 * self._words
+        self._relleno = b"\0" * (self._tam - key_size)
+        self._con_valores = values
+        self._reservar(max(8, 1 << (capacity - 1).bit_length()))
+
+    def _reservar(self, capacity):
+        self._mask = capacity - 1
+        self._keys_buf = bytearray(capacity * self._tam)
+        self._estado_buf = bytearray(capacity)
+        self.keys = np.frombuffer(self._keys_buf, dtype=np.uint64).reshape(capacity, self._words)
+        self.estado = np.frombuffer(self._estado_buf, dtype=np.uint8)
+        self.values = None
+        if self._con_valores:
+            values_buf = bytearray(4 * capacity)
+            self.values = np.frombuffer(values_buf, dtype=np.int32)
+            self._values_mv = memoryview(values_buf).cast('i')
+        self._len = 0
+        self._usadas = 0  # ocupadas + borradas
+
+    # (posición, encontrada, clave con relleno). Si no está, la posición es donde
+    # habría que meterla (la primera borrada del sondeo, o la libre final).
+    def _buscar(self, key):
+        kb = key + self._relleno
+        estado = self._estado_buf
+        keys = self._keys_buf
+        tam = self._tam
+        mask = self._mask
+        pos = zlib.crc32(kb) & mask
+        borrada = -1
+        while True:
+            e = estado[pos]
+            if e == self.LIBRE:
+                return (pos if borrada < 0 else borrada), False, kb
+            if e == self.OCUPADA:
+                if keys[pos * tam:(pos + 1) * tam] == kb:
+                    return pos, True, kb
+            elif borrada < 0:
+                borrada = pos
+            pos = (pos + 1) & mask
+
+    def _meter(self, pos, kb, valor):
+        if self._estado_buf[pos] == self.LIBRE:
+            self._usadas += 1
+        self._estado_buf[pos] = self.OCUPADA
+        self._keys_buf[pos * self._tam:(pos + 1) * self._tam] = kb
+        if self._con_valores:
+            self._values_mv[pos] = valor
+        self._len += 1
+        if 3 * self._usadas > 2 * (self._mask + 1):
+            self._crecer()
+
+    def _crecer(self):
+        ocupadas = np.flatnonzero(self.estado == self.OCUPADA)
+        keys = self.keys[ocupadas]
+        valores = self.values[ocupadas].tolist() if self._con_valores else None
+        capacidad = self._mask + 1
+        # si sobra sitio es que casi todo eran borradas: basta con limpiar
+        self._reservar(capacidad * 2 if 2 * len(ocupadas) > capacidad // 2 else capacidad)
+        for k in range(len(ocupadas)):
+            pos, _, kb = self._buscar(keys[k].tobytes()[:self.key_size])
+            self._meter(pos, kb, valores[k] if valores is not None else 0)
+
+    def __contains__(self, key):
+        return self._buscar(key)[1]
+
+    def add(self, key):
+        pos, encontrada, kb = self._buscar(key)
+        if not encontrada:
+            self._meter(pos, kb, 0)
+
+    def discard(self, key):
+        pos, encontrada, _ = self._buscar(key)
+        if encontrada:
+            self._estado_buf[pos] = self.BORRADA
+            self._len -= 1
+
+    def __getitem__(self, key):
+        pos, encontrada, _ = self._buscar(key)
+        if not encontrada:
+            raise KeyError(key)
+        return self._values_mv[pos]
+
+    def __setitem__(self, key, valor):
+        pos, encontrada, kb = self._buscar(key)
+        if encontrada:
+            self._values_mv[pos] = valor
+        else:
+            self._meter(pos, kb, valor)
+
+    def get(self, key, default=None):
+        pos, encontrada, _ = self._buscar(key)
+        return self._values_mv[pos] if encontrada else default
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        tam = self._tam
+        for pos in np.flatnonzero(self.estado == self.OCUPADA).tolist():
+            yield bytes(self._keys_buf[pos * tam:pos * tam + self.key_size])
+
+    # bytes que ocupan los arrays de la tabla
+    def nbytes(self):
+        total = self.keys.nbytes + self.estado.nbytes
+        return total + (self.values.nbytes if self._con_valores else 0)
+
+    # Guarda la tabla en `directorio` como ficheros .npy (claves, estado de las
+    # casillas, valores y un pequeño array con los tamaños)
+    def save(self, directorio):
+        os.makedirs(directorio, exist_ok=True)
+        np.save(os.path.join(directorio, "claves.npy"), self.keys)
+        np.save(os.path.join(directorio, "estado.npy"), self.estado)
+        if self._con_valores:
+            np.save(os.path.join(directorio, "valores.npy"), self.values)
+        np.save(os.path.join(directorio, "meta.npy"),
+                np.array([self.key_size, self._len, self._usadas, int(self._con_valores)], dtype=np.int64))
+
+    # Abre una tabla guardada con save. Con mmap=True los arrays se mapean del disco
+    # en solo lectura (np.load con mmap_mode='r'): abrirla no cuesta nada y solo se
+    # leen las páginas que se consultan, pero no se puede modificar.
+    @classmethod
+    def load(cls, directorio, mmap=True):
+        modo = 'r' if mmap else None
+        key_size, longitud, usadas, con_valores = np.load(os.path.join(directorio, "meta.npy")).tolist()
+        tabla = cls.__new__(cls)
+        tabla.key_size = key_size
+        tabla._words = -(-key_size // 8)
+        tabla._tam = 8 * tabla._words
+        tabla._relleno = b"\0" * (tabla._tam - key_size)
+        tabla._con_valores = bool(con_valores)
+        tabla.keys = np.load(os.path.join(directorio, "claves.npy"), mmap_mode=modo)
+        tabla.estado = np.load(os.path.join(directorio, "estado.npy"), mmap_mode=modo)
+        tabla._mask = len(tabla.estado) - 1
+        tabla._keys_buf = memoryview(tabla.keys.reshape(-1).view(np.uint8))
+        tabla._estado_buf = memoryview(tabla.estado)
+        tabla.values = None
+        if tabla._con_valores:
+            tabla.values = np.load(os.path.join(directorio, "valores.npy"), mmap_mode=modo)
+            tabla._values_mv = memoryview(tabla.values)
+        tabla._len = longitud
+        tabla._usadas = usadas
+        return tabla
+
+
+class ParentTable:
+    # Punteros al padre para rehacer los caminos: cada nodo generado recibe un id
+    # entero y se guarda en arrays el id de su padre (-1 en la raíz) y el movimiento
+    # que lleva hasta él, codificado como origen * num_tubes + destino en un byte.
+    # Las fronteras llevan el id junto al estado en vez de diccionarios padre y
+    # mov_que_lleva por clave.
+    def __init__(self, num_tubes):
+        self.num_tubes = num_tubes
+        self.padres = array('i')
+        self.movimientos = array('B' if num_tubes * num_tubes <= 256 else 'H')
+
+    def add(self, padre, movimiento):
+        self.padres.append(padre)
+        self.movimientos.append(0 if movimiento is None else movimiento[0] * self.num_tubes + movimiento[1])
+        return len(self.padres) - 1
+
+    # movimiento con el que se llegó al nodo (None en la raíz)
+    def move(self, nodo):
+        if self.padres[nodo] < 0:
+            return None
+        return divmod(self.movimientos[nodo], self.num_tubes)
+
+    def path(self, nodo):
+        camino = []
+        while self.padres[nodo] >= 0:
+            camino.append(divmod(self.movimientos[nodo], self.num_tubes))
+            nodo = self.padres[nodo]
+        camino.reverse()
+        return camino
+
+    def __len__(self):
+        return len(self.padres)
+
+
+# `funcion` envuelta para sumar en contador = [ns, llamadas] lo que tarda cada vez
+def _measured(funcion, contador):
+    reloj = time.perf_counter_ns
+
+    def medida(*args, **kwargs):
+        inicio = reloj()
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            contador[0] += reloj() - inicio
+            contador[1] += 1
+    return medida
+
+
+# RSS actual del proceso en bytes: /proc en Linux, si no psutil (si está instalado)
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+class _RssSampler(threading.Thread):
+    # Hilo que lee el RSS cada `intervalo` segundos y se queda con el máximo
+    def __init__(self, intervalo=0.01):
+        super().__init__(daemon=True)
+        self.intervalo = intervalo
+        self.pico = _rss_bytes()
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            self._muestra()
+
+    def _muestra(self):
+        rss = _rss_bytes()
+        if rss is not None:
+            self.pico = rss if self.pico is None else max(self.pico, rss)
+
+    def stop(self):
+        self._parar.set()
+        self.join()
+        self._muestra()
+
+
+class _ProfiledGame:
+    # Partida que mide los métodos de `fases` ({nombre: contador}) y delega todo lo
+    # demás en la partida original
+    def __init__(self, game, fases):
+        self._game = game
+        for nombre, contador in fases.items():
+            setattr(self, nombre, _measured(getattr(game, nombre), contador))
+
+    def __getattr__(self, nombre):
+        return getattr(self._game, nombre)
+
+
+class SearchAlgorithm:
+    # packed=True hace que todas las búsquedas trabajen sobre PackedWaterSortGame.
+    # fold_colors=True considera iguales los estados que solo difieren en el nombre
+    # de los colores (además de en el orden de los tubos).
+    # prune=True poda los movimientos redundantes (ver get_valid_moves); por defecto
+    # se generan todos, como en las pruebas de resultados_pruebas.csv.
+    # incremental=False obliga a evaluar la heurística entera en cada hijo.
+    # batch=True evalúa la heurística de todos los hijos de un nodo de una vez con
+    # numpy (hX_batch) en vez de uno a uno.
+    # h_cache_size > 0 memoriza los valores de h1/h2/h3 por clave canónica, como
+    # mucho h_cache_size por heurística (se expulsa el usado hace más tiempo), y
+    # añade los aciertos/fallos de la memo a las estadísticas de A* e IDA*.
+    # compact_tables=True guarda cerrados/visitados y g_cost en VisitedTable (arrays
+    # numpy, unos 44-66 bytes por estado en vez de 85-99) a cambio de ir más lento;
+    # por eso no es lo normal (ver VisitedTable).
+    # pattern_db es la base de datos de patrones de h_pdb: un PatternDatabase o el
+    # directorio donde se guardó (ver pattern_db.py).
+    # profile=True mide cada fase de las búsquedas (ver _enable_profiling); si no, no
+    # cuesta nada.
+    # measure_memory=True mide la memoria real de cada búsqueda (ver
+    # _measure_memory_search): tracemalloc hace que todo vaya bastante más lento.
+    def __init__(self, game, packed=False, fold_colors=False, prune=False, incremental=True,
+                 batch=False, h_cache_size=0, compact_tables=False, pattern_db=None, profile=False,
+                 measure_memory=False):
+        if packed and not isinstance(game, PackedWaterSortGame):
+            game = PackedWaterSortGame(game)
+        self.game = game
+        self.fold_colors = fold_colors
+        self.prune = prune
+        self.incremental = incremental
+        self.batch = batch
+        self.compact_tables = compact_tables
+        if isinstance(pattern_db, str):
+            from pattern_db import PatternDatabase
+            pattern_db = PatternDatabase.load(pattern_db)
+        self.pattern_db = pattern_db
+        # para rehacer este mismo SearchAlgorithm en otro proceso (ver _worker_config)
+        self._opciones = {'packed': isinstance(game, PackedWaterSortGame), 'fold_colors': fold_colors,
+                          'prune': prune, 'incremental': incremental, 'batch': batch,
+                          'h_cache_size': h_cache_size, 'compact_tables': compact_tables,
+                          'pattern_db': pattern_db.directorio if pattern_db is not None else None}
+        self._color_count_cache = {}
+        self._h2_cache = {}
+        self._h3_cache = {}
+        self._delta_forms = {
+            self.h1: (self.h1_contrib, self.h1_delta),
+            self.h2: (self.h2_contrib, self.h2_delta),
+            self.h3: (self.h3_contrib, self.h3_delta),
+        }
+        self._batch_forms = {self.h1: self.h1_batch, self.h2: self.h2_batch, self.h3: self.h3_batch}
+        self._h_caches = {}
+        if h_cache_size:
+            self._h_caches = {hf: HeuristicCache(h_cache_size) for hf in (self.h1, self.h2, self.h3)}
+        self.profile = profile
+        if profile:
+            self._enable_profiling()
+        self.measure_memory = measure_memory
+        if measure_memory:
+            for nombre in self.PUBLIC_SEARCHES:
+                setattr(self, nombre, self._measure_memory_search(getattr(self, nombre)))
+
+    # Heurísticas que nunca sobrestiman el coste real (la cota de ara_star solo vale
+    # con estas): h_pdb es la distancia exacta en un problema relajado. h1, h2 y h3
+    # pueden pasarse (p. ej. 5 tubos, 3 colores, semilla 3: óptimo 5, h1 = 7).
+    ADMISSIBLE_HEURISTICS = ('h_pdb',)
+
+    # Búsquedas públicas, las que envuelven el perfilado y la medida de memoria
+    PUBLIC_SEARCHES = ('bfs', 'dfs', 'a_star', 'ara_star', 'greedy_best_first', 'beam_search', 'dls',
+                       'ida_star', 'parallel_bfs', 'external_bfs', 'parallel_a_star')
+
+    # Perfilado por fases: se envuelven (solo en este objeto) los métodos de cada fase
+    # para sumar su tiempo con time.perf_counter_ns y contar las llamadas, y cada
+    # búsqueda pública pone los contadores a cero al empezar y los añade a sus stats
+    # como perfil_<fase>_ms y perfil_<fase>_llamadas. perfil_resto_ms es el tiempo que
+    # no cae en ninguna fase: sobre todo las operaciones de abiertos/cerrados y padres.
+    FASES_PERFIL = ('movimientos', 'aplicar', 'clave', 'meta', 'heuristica')
+
+    def _enable_profiling(self):
+        self._perfil = {fase: [0, 0] for fase in self.FASES_PERFIL}
+        self.game = _ProfiledGame(self.game, {
+            'get_valid_moves': self._perfil['movimientos'],
+            'apply_move': self._perfil['aplicar'],
+            '_pour': self._perfil['aplicar'],
+            'is_goal_state': self._perfil['meta'],
+        })
+        self._key = _measured(self._key, self._perfil['clave'])
+        self._children_h = _measured(self._children_h, self._perfil['heuristica'])
+        self._state_h = _measured(self._state_h, self._perfil['heuristica'])
+        for nombre in self.PUBLIC_SEARCHES:
+            setattr(self, nombre, self._profiled_search(getattr(self, nombre)))
+
+    def _profiled_search(self, busqueda):
+        def perfilada(*args, **kwargs):
+            for contador in self._perfil.values():
+                contador[0] = contador[1] = 0
+            camino, stats = busqueda(*args, **kwargs)
+            medido = 0
+            for fase, (ns, llamadas) in self._perfil.items():
+                stats[f'perfil_{fase}_ms'] = ns / 1e6
+                stats[f'perfil_{fase}_llamadas'] = llamadas
+                medido += ns
+            stats['perfil_resto_ms'] = max(0.0, stats['tiempo_seg'] * 1000 - medido / 1e6)
+            return camino, stats
+        return perfilada
+
+    # Memoria real de una búsqueda, no solo el número de nodos: añade a las stats el
+    # pico de bytes reservados por Python durante la búsqueda (tracemalloc, cuenta
+    # padres, g_cost, duplicados del heap...) y el pico de RSS del proceso, muestreado
+    # cada 10 ms por un hilo aparte. Los dos en MB: memoria_pico_tracemalloc_mb y
+    # memoria_pico_rss_mb (None si no se puede leer el RSS).
+    def _measure_memory_search(self, busqueda):
+        def medida(*args, **kwargs):
+            ya_trazando = tracemalloc.is_tracing()
+            if not ya_trazando:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            muestreo = _RssSampler()
+            muestreo.start()
+            try:
+                camino, stats = busqueda(*args, **kwargs)
+            finally:
+                muestreo.stop()
+                pico = tracemalloc.get_traced_memory()[1]
+                if not ya_trazando:
+                    tracemalloc.stop()
+            stats['memoria_pico_tracemalloc_mb'] = (pico - base) / (1024 * 1024)
+            stats['memoria_pico_rss_mb'] = muestreo.pico / (1024 * 1024) if muestreo.pico is not None else None
+            return camino, stats
+        return medida
+
+    # Progreso en vivo de una búsqueda pública (nombre en PUBLIC_SEARCHES): se ejecuta
+    # en un hilo y el generador va dando los eventos de SearchBudget.progress_event
+    # (con 'evento': 'progreso') cada interval segundos. El último es
+    # {'evento': 'fin', 'camino': ..., 'stats': ...}. Si se deja de leer el generador
+    # antes (break, close(), Ctrl+C) la búsqueda se cancela.
+    def progress_events(self, nombre, *args, interval=1.0, budget=None, **kwargs):
+        if budget is None:
+            budget = SearchBudget()
+        eventos = queue.Queue()
+
+        def aviso(evento):
+            evento['evento'] = 'progreso'
+            eventos.put(evento)
+
+        budget.on_progress = aviso
+        budget.progress_interval = interval
+        resultado = {}
+
+        def ejecutar():
+            try:
+                resultado['camino'], resultado['stats'] = getattr(self, nombre)(*args, budget=budget, **kwargs)
+            except BaseException as e:
+                resultado['error'] = e
+            finally:
+                eventos.put(None)
+
+        hilo = threading.Thread(target=ejecutar, daemon=True)
+        hilo.start()
+        terminado = False
+        try:
+            while True:
+                evento = eventos.get()
+                if evento is None:
+                    break
+                yield evento
+            terminado = True
+        finally:
+            if not terminado:
+                budget.cancel()
+            hilo.join()
+        if 'error' in resultado:
+            raise resultado['error']
+        yield {'evento': 'fin', 'camino': resultado['camino'], 'stats': resultado['stats']}
+
+    def _moves(self, state, last_move=None):
+        return self.game.get_valid_moves(state, prune=self.prune, last_move=last_move)
+
+    # Valores de la heurística para los hijos de `estado` (que tiene valor h), dados
+    # como (movimiento, nuevo_estado, clave). Se usa, por este orden de preferencia:
+    # la memo de la heurística, la versión por lotes (batch=True), la incremental
+    # (incremental=True) y, si no, la heurística entera hijo a hijo.
+    def _children_h(self, heuristic, estado, h, hijos):
+        cache = self._h_caches.get(heuristic)
+        valores = [None] * len(hijos)
+        pendientes = []  # índices de los hijos que hay que calcular
+        for k, (_, _, key) in enumerate(hijos):
+            valores[k] = cache.get(key) if cache is not None else None
+            if valores[k] is None:
+                pendientes.append(k)
+        if not pendientes:
+            return valores
+
+        batch_h = self._batch_forms.get(heuristic) if self.batch else None
+        forma = self._delta_forms.get(heuristic) if self.incremental else None
+        if batch_h is not None:
+            movs = [hijos[k][0] for k in pendientes]
+            nuevos = [hijos[k][1] for k in pendientes]
+            calculados = batch_h(self.game.children_array(estado, movs, nuevos)).tolist()
+        elif forma is not None:
+            contrib_fn, delta_fn = forma
+            contrib = contrib_fn(estado)
+            tube_value = self.game.tube_value
+            calculados = []
+            for k in pendientes:
+                (i, j), nuevo_estado, _ = hijos[k]
+                calculados.append(delta_fn(h, contrib, (i, j),
+                                           tube_value(nuevo_estado, i), tube_value(nuevo_estado, j)))
+        else:
+            calculados = [heuristic(hijos[k][1]) for k in pendientes]
+
+        for k, valor in zip(pendientes, calculados):
+            valores[k] = valor
+            if cache is not None:
+                cache.put(hijos[k][2], valor)
+        return valores
+
+    # h de un estado suelto (el inicial), pasando por la memo si la hay
+    def _state_h(self, heuristic, estado, key):
+        cache = self._h_caches.get(heuristic)
+        valor = cache.get(key) if cache is not None else None
+        if valor is None:
+            valor = heuristic(estado)
+            if cache is not None:
+                cache.put(key, valor)
+        return valor
+
+    def _cache_stats(self, heuristic, stats, inicio):
+        cache = self._h_caches.get(heuristic)
+        if cache is not None:
+            stats['cache_h_aciertos'] = cache.hits - inicio[0]
+            stats['cache_h_fallos'] = cache.misses - inicio[1]
+        return stats
+
+    def _cache_counters(self, heuristic):
+        cache = self._h_caches.get(heuristic)
+        return (cache.hits, cache.misses) if cache is not None else None
+
+    # Estadísticas que devuelven todas las búsquedas. status es 'solved' (hay camino),
+    # 'exhausted' (no quedan estados por explorar) o 'budget' (se ha parado por un
+    # límite del SearchBudget; cuál, en 'limite').
+    def _stats(self, t0, nodos_expandidos, pico_memoria, camino, status, limite=None):
+        stats = {
+            'nodos_expandidos': nodos_expandidos,
+            'nodos_en_memoria_max': pico_memoria,
+            'tiempo_seg': time.time() - t0,
+            'profundidad_solucion': len(camino) if camino is not None else None,
+            'status': status
+        }
+        if limite is not None:
+            stats['limite'] = limite
+        return stats
+
+    # Lo que necesita otro proceso para rehacer este SearchAlgorithm (ver
+    # _solver_from_config)
+    def _worker_config(self):
+        return (self.game.num_tubes, self.game.num_colors, self.game.seed, self._opciones)
+
+    # Conjuntos de claves (cerrados, visitados...) y diccionarios clave -> g de las
+    # búsquedas: de Python o, con compact_tables=True, VisitedTable
+    def _key_set(self, *claves):
+        tabla = VisitedTable(self.game._key_struct.size) if self.compact_tables else set()
+        for key in claves:
+            tabla.add(key)
+        return tabla
+
+    def _key_costs(self):
+        return VisitedTable(self.game._key_struct.size, values=True) if self.compact_tables else {}
+
+    # clave con la que se guardan los estados en cerrados, abiertos, g_cost y padre
+    def _key(self, state):
+        return self.game.canonical_key(state, self.fold_colors)
+
+    def bfs(self, initial_state, budget=None):
         t0 = time.time()
-        ini_key = self.game.state_to_tuple(initial_state)
-        ini_hash = self.game.hash_state(ini_key)
+        initial_state = self.game.encode(initial_state)
+        ini_key = self._key(initial_state)
 
         if self.game.is_goal_state(initial_state):
-            t1 = time.time()
-            return [], {
-                'nodos_expandidos': 0,
-                'nodos_en_memoria_max': 1,
-                'tiempo_seg': t1 - t0,
-                'profundidad_solucion': 0
-            }
-
-        abiertos = deque([initial_state])  
-        cerrados = set()
-        abiertos_set = {ini_hash}    
-        padre = {ini_key: None}               
-        mov_que_lleva = {}                   
+            return [], self._stats(t0, 0, 1, [], 'solved')
+
+        padres = ParentTable(self.game.num_tubes)
+        abiertos = deque([(initial_state, padres.add(-1, None))])  # (estado, id del nodo)
+        cerrados = self._key_set()
+        abiertos_set = self._key_set(ini_key)
 
         nodos_expandidos = 0
         pico_memoria = len(cerrados) + len(abiertos)
 
         while abiertos:
-            estado = abiertos.popleft()
-            key_estado = self.game.state_to_tuple(estado)
-            hash_estado = self.game.hash_state(key_estado)
-            cerrados.add(hash_estado)
+            limite = budget.exceeded(t0, nodos_expandidos, len(abiertos)) if budget is not None else None
+            if limite:
+                return None, self._stats(t0, nodos_expandidos, pico_memoria, None, 'budget', limite)
+            estado, nodo = abiertos.popleft()
+            key_estado = self._key(estado)
+            cerrados.add(key_estado)
             nodos_expandidos += 1
             if self.game.is_goal_state(estado):
            
-                camino = []
-                cur = key_estado
-                while padre[cur] is not None:
-                    camino.append(mov_que_lleva[cur])
-                    cur = padre[cur]
-                camino.reverse()
+                camino = padres.path(nodo)
 
-                t1 = time.time()
                 pico_memoria = max(pico_memoria, len(abiertos) + len(cerrados))
-                stats = {
-                    'nodos_expandidos': nodos_expandidos,
-                    'nodos_en_memoria_max': pico_memoria,
-                    'tiempo_seg': t1 - t0,
-                    'profundidad_solucion': len(camino)
-                }
+                stats = self._stats(t0, nodos_expandidos, pico_memoria, camino, 'solved')
                 return camino, stats
 
-            for movimiento in self.game.get_valid_moves(estado): # Expande el nodo
+            for movimiento in self._moves(estado, padres.move(nodo)): # Expande el nodo
                 nuevo_estado = self.game.apply_move(estado, movimiento)
 
-                key = self.game.state_to_tuple(nuevo_estado)
-                hash_new_state = self.game.hash_state(key)
+                key = self._key(nuevo_estado)
 
-                if hash_new_state not in cerrados and hash_new_state not in abiertos_set:
-                    padre[key] = key_estado  
-                    mov_que_lleva[key] = movimiento
-                    abiertos.append(nuevo_estado)
-                    abiertos_set.add(hash_new_state)
+                if key not in cerrados and key not in abiertos_set:
+                    abiertos.append((nuevo_estado, padres.add(nodo, movimiento)))
+                    abiertos_set.add(key)
                     pico_memoria = max(pico_memoria, len(abiertos) + len(cerrados))
 
-        t1 = time.time()
-        stats = {
-            'nodos_expandidos': nodos_expandidos,
-            'nodos_en_memoria_max': pico_memoria,
-            'tiempo_seg': t1 - t0,
-            'profundidad_solucion': None
-        }
+        stats = self._stats(t0, nodos_expandidos, pico_memoria, None, 'exhausted')
         return cerrados, stats
     
     ######################################################################################################################
-    def dfs(self, initial_state):
+    def dfs(self, initial_state, budget=None):
         t0 = time.time()
-        ini_key = self.game.state_to_tuple(initial_state)
-        ini_hash = self.game.hash_state(ini_key)
+        initial_state = self.game.encode(initial_state)
+        ini_key = self._key(initial_state)
 
         if self.game.is_goal_state(initial_state):
-            t1 = time.time()
-            return [], {
-                'nodos_expandidos': 0,
-                'nodos_en_memoria_max': 1,
-                'tiempo_seg': t1 - t0,
-                'profundidad_solucion': 0
-            }
-
-        abiertos = deque([initial_state])  
-        cerrados = set()
-        abiertos_set = {ini_hash}    
-        padre = {ini_key: None}               
-        mov_que_lleva = {}                   
+            return [], self._stats(t0, 0, 1, [], 'solved')
+
+        padres = ParentTable(self.game.num_tubes)
+        abiertos = deque([(initial_state, padres.add(-1, None))])  # (estado, id del nodo)
+        cerrados = self._key_set()
+        abiertos_set = self._key_set(ini_key)
 
         nodos_expandidos = 0
         pico_memoria = len(cerrados) + len(abiertos)
 
         while abiertos:
-            estado = abiertos.pop()
-            key_estado = self.game.state_to_tuple(estado)
-            hash_estado = self.game.hash_state(key_estado)
-            cerrados.add(hash_estado)
+            limite = budget.exceeded(t0, nodos_expandidos, len(abiertos)) if budget is not None else None
+            if limite:
+                return None, self._stats(t0, nodos_expandidos, pico_memoria, None, 'budget', limite)
+            estado, nodo = abiertos.pop()
+            key_estado = self._key(estado)
+            cerrados.add(key_estado)
             nodos_expandidos += 1
             if self.game.is_goal_state(estado):
            
-                camino = []
-                cur = key_estado
-                while padre[cur] is not None:
-                    camino.append(mov_que_lleva[cur])
-                    cur = padre[cur]
-                camino.reverse()
+                camino = padres.path(nodo)
 
-                t1 = time.time()
                 pico_memoria = max(pico_memoria, len(abiertos) + len(cerrados))
-                stats = {
-                    'nodos_expandidos': nodos_expandidos,
-                    'nodos_en_memoria_max': pico_memoria,
-                    'tiempo_seg': t1 - t0,
-                    'profundidad_solucion': len(camino)
-                }
+                stats = self._stats(t0, nodos_expandidos, pico_memoria, camino, 'solved')
                 return camino, stats
 
-            for movimiento in self.game.get_valid_moves(estado): # Expande el nodo
+            for movimiento in self._moves(estado, padres.move(nodo)): # Expande el nodo
                 nuevo_estado = self.game.apply_move(estado, movimiento)
 
-                key = self.game.state_to_tuple(nuevo_estado)
-                hash_new_state = self.game.hash_state(key)
+                key = self._key(nuevo_estado)
 
-                if hash_new_state not in cerrados and hash_new_state not in abiertos_set:
-                    padre[key] = key_estado  
-                    mov_que_lleva[key] = movimiento
-                    abiertos.append(nuevo_estado)
-                    abiertos_set.add(hash_new_state)
+                if key not in cerrados and key not in abiertos_set:
+                    abiertos.append((nuevo_estado, padres.add(nodo, movimiento)))
+                    abiertos_set.add(key)
                     pico_memoria = max(pico_memoria, len(abiertos) + len(cerrados))
 
-        t1 = time.time()
-        stats = {
-            'nodos_expandidos': nodos_expandidos,
-            'nodos_en_memoria_max': pico_memoria,
-            'tiempo_seg': t1 - t0,
-            'profundidad_solucion': None
-        }
+        stats = self._stats(t0, nodos_expandidos, pico_memoria, None, 'exhausted')
         return cerrados, stats
    
     
     ######################################################################################################################
-    def a_star(self, initial_state, heuristic):
+    # weight > 1 hace A* ponderado (f = g + weight*h): expande muchos menos nodos a
+    # cambio de que el camino pueda ser hasta weight veces más largo que el óptimo.
+    def a_star(self, initial_state, heuristic, budget=None, weight=1):
         t0 = time.time()
-        ini_key = self.game.state_to_tuple(initial_state)
-        ini_hash = self.game.hash_state(ini_key)
+        initial_state = self.game.encode(initial_state)
+        ini_key = self._key(initial_state)
 
         if self.game.is_goal_state(initial_state):
-            t1 = time.time()
-            return [], {
-                'nodos_expandidos': 0,
-                'nodos_en_memoria_max': 1,
-                'tiempo_seg': t1 - t0,
-                'profundidad_solucion': 0
-            }
+            return [], self._stats(t0, 0, 1, [], 'solved')
 
         pendientes = []
         cont = 0  # desempate en heapq
-        h0 = heuristic(initial_state)
-        heapq.heappush(pendientes, (h0, 0, cont, initial_state))
+        cache_ini = self._cache_counters(heuristic)
+        h0 = self._state_h(heuristic, initial_state, ini_key)
+        padres = ParentTable(self.game.num_tubes)
+        heapq.heappush(pendientes, (weight * h0, 0, cont, initial_state, h0, padres.add(-1, None)))
 
-        visitados = set()                # conjunto de hashes
-        padre = {ini_key: None}          # claves = tuplas
-        mov_que_lleva = {}
-        g_cost = {ini_hash: 0}
+        visitados = self._key_set()                # conjunto de claves canónicas
+        g_cost = self._key_costs()
+        g_cost[ini_key] = 0
 
         nodos_expandidos = 0
         pico_memoria = len(pendientes)
 
         while pendientes:
-            f, g, _, estado = heapq.heappop(pendientes)
-            key = self.game.state_to_tuple(estado)
-            hash_key = self.game.hash_state(key)
+            limite = budget.exceeded(t0, nodos_expandidos, len(pendientes), pendientes[0][0]) if budget is not None else None
+            if limite:
+                return None, self._cache_stats(heuristic, self._stats(t0, nodos_expandidos, pico_memoria, None, 'budget', limite), cache_ini)
+            f, g, _, estado, h, nodo = heapq.heappop(pendientes)
+            key = self._key(estado)
 
-            if hash_key in visitados:
+            if key in visitados:
                 continue
-            visitados.add(hash_key)
+            visitados.add(key)
             nodos_expandidos += 1
 
             if self.game.is_goal_state(estado):
-                camino = []
-                cur = key
-                while padre[cur] is not None:
-                    camino.append(mov_que_lleva[cur])
-                    cur = padre[cur]
-                camino.reverse()
+                camino = padres.path(nodo)
 
-                t1 = time.time()
                 pico_memoria = max(pico_memoria, len(pendientes) + len(visitados))
-                stats = {
-                    'nodos_expandidos': nodos_expandidos,
-                    'nodos_en_memoria_max': pico_memoria,
-                    'tiempo_seg': t1 - t0,
-                    'profundidad_solucion': len(camino)
-                }
-                return camino, stats
+                stats = self._stats(t0, nodos_expandidos, pico_memoria, camino, 'solved')
+                return camino, self._cache_stats(heuristic, stats, cache_ini)
 
             # Expandimos movimientos válidos
-            for movimiento in self.game.get_valid_moves(estado):
+            g_new = g + 1
+            hijos = []
+            for movimiento in self._moves(estado, padres.move(nodo)):
                 nuevo_estado = self.game.apply_move(estado, movimiento)
-                key_new = self.game.state_to_tuple(nuevo_estado)
-                hash_new = self.game.hash_state(key_new)
-
-                g_new = g + 1
-                f_new = g_new + heuristic(nuevo_estado)
+                key_new = self._key(nuevo_estado)
 
                 # Solo añadimos si no está visitado o si mejora el coste
-                if hash_new not in visitados and (hash_new not in g_cost or g_new < g_cost[hash_new]):
+                if key_new not in visitados and (key_new not in g_cost or g_new < g_cost[key_new]):
+                    g_cost[key_new] = g_new
+                    hijos.append((movimiento, nuevo_estado, key_new))
+
+            valores_h = self._children_h(heuristic, estado, h, hijos)
+            for (movimiento, nuevo_estado, _), h_new in zip(hijos, valores_h):
+                cont += 1
+                heapq.heappush(pendientes, (g_new + weight * h_new, g_new, cont, nuevo_estado, h_new,
+                                            padres.add(nodo, movimiento)))
+
+            pico_memoria = max(pico_memoria, len(pendientes) + len(visitados))
+
+        # Si no hay solución
+        stats = self._stats(t0, nodos_expandidos, pico_memoria, None, 'exhausted')
+        return None, self._cache_stats(heuristic, stats, cache_ini)
+
+######################################################################################################################
+    # ARA*: A* ponderado "anytime". Busca primero con el peso más alto de `weights`
+    # (una solución rápida) y va bajando el peso para mejorarla, reutilizando los g
+    # ya calculados: los estados mejorados tras cerrarse (INCONS) y los abiertos se
+    # reordenan con el nuevo peso en vez de empezar de cero.
+    # Cada mejora se guarda en stats['soluciones'] con su coste, su peso y la cota de
+    # suboptimalidad min(peso, coste / min(g + h) de abiertos e INCONS); la cota tras
+    # la última iteración queda en stats['cota']. La cota solo es cierta si la
+    # heurística es admisible: admissible=None lo decide por ADMISSIBLE_HEURISTICS y,
+    # si no lo es, la cota es None. Con budget, al pararse devuelve la mejor solución
+    # encontrada hasta entonces.
+    def ara_star(self, initial_state, heuristic, weights=(5, 3, 2, 1.5, 1), budget=None, admissible=None):
+        t0 = time.time()
+        initial_state = self.game.encode(initial_state)
+        ini_key = self._key(initial_state)
+
+        if self.game.is_goal_state(initial_state):
+            stats = self._stats(t0, 0, 1, [], 'solved')
+            stats['soluciones'] = []
+            return [], stats
+
+        if admissible is None:
+            admissible = getattr(heuristic, '__name__', None) in self.ADMISSIBLE_HEURISTICS
+        cache_ini = self._cache_counters(heuristic)
+        h = {ini_key: self._state_h(heuristic, initial_state, ini_key)}
+        g_cost = self._key_costs()
+        g_cost[ini_key] = 0
+        padre = {ini_key: None}
+        estados = {ini_key: initial_state}  # estado concreto con el que se llegó a cada clave
+        mov_que_lleva = {}
+
+        abiertos = []
+        en_abiertos = {ini_key}
+        incons = set()
+        cont = 0
+        g_meta = float('inf')
+        key_meta = None
+        soluciones = []
+        mejor_camino = None
+
+        nodos_expandidos = 0
+        pico_memoria = 1
+        limite = None
+
+        for weight in weights:
+            # abiertos ∪ INCONS, ordenados con el nuevo peso
+            en_abiertos |= incons
+            incons = set()
+            abiertos = []
+            for key in en_abiertos:
+                cont += 1
+                abiertos.append((g_cost[key] + weight * h[key], g_cost[key], cont, key))
+            heapq.heapify(abiertos)
+            cerrados = self._key_set()
+
+            while abiertos and abiertos[0][0] < g_meta:
+                if budget is not None:
+                    limite = budget.exceeded(t0, nodos_expandidos, len(abiertos), abiertos[0][0])
+                    if limite:
+                        break
+                f, g, _, key = heapq.heappop(abiertos)
+                if key in cerrados or g != g_cost[key]:
+                    continue  # entrada vieja: la clave se mejoró después
+                en_abiertos.discard(key)
+                cerrados.add(key)
+                nodos_expandidos += 1
+                estado = estados[key]
+
+                hijos = []
+                for movimiento in self._moves(estado, mov_que_lleva.get(key)):
+                    nuevo_estado = self.game.apply_move(estado, movimiento)
+                    key_new = self._key(nuevo_estado)
+                    g_new = g + 1
+                    if g_new >= g_cost.get(key_new, float('inf')):
+                        continue
+                    g_cost[key_new] = g_new
                     padre[key_new] = key
+                    estados[key_new] = nuevo_estado
                     mov_que_lleva[key_new] = movimiento
-                    g_cost[hash_new] = g_new
+                    if self.game.is_goal_state(nuevo_estado):
+                        g_meta, key_meta = g_new, key_new
+                    elif key_new in cerrados:
+                        incons.add(key_new)
+                    else:
+                        hijos.append((movimiento, nuevo_estado, key_new))
+
+                nuevos = [hijo for hijo in hijos if hijo[2] not in h]
+                for (_, _, key_new), valor in zip(nuevos, self._children_h(heuristic, estado, h[key], nuevos)):
+                    h[key_new] = valor
+                for _, _, key_new in hijos:
                     cont += 1
-                    heapq.heappush(pendientes, (f_new, g_new, cont, nuevo_estado))
+                    heapq.heappush(abiertos, (g_cost[key_new] + weight * h[key_new], g_cost[key_new], cont, key_new))
+                    en_abiertos.add(key_new)
+                pico_memoria = max(pico_memoria, len(g_cost))
+
+            cota = None
+            if key_meta is not None and admissible:
+                # nunca por debajo de 1
+                pendientes_f = [g_cost[k] + h[k] for k in en_abiertos | incons]
+                cota = 1
+                if pendientes_f and min(pendientes_f) > 0:
+                    cota = max(1, min(weight, g_meta / min(pendientes_f)))
+            if key_meta is not None and (not soluciones or g_meta < soluciones[-1]['coste']):
+                claves = []
+                cur = key_meta
+                while cur is not None:
+                    claves.append(cur)
+                    cur = padre[cur]
+                claves.reverse()
+                mejor_camino = self._path_from_keys(initial_state, claves)
+                soluciones.append({
+                    'peso': weight,
+                    'coste': g_meta,
+                    'cota': cota,
+                    'nodos_expandidos': nodos_expandidos,
+                    'tiempo_seg': time.time() - t0,
+                    'camino': mejor_camino
+                })
+            if limite:
+                break
+
+        if limite:
+            stats = self._stats(t0, nodos_expandidos, pico_memoria, mejor_camino, 'budget', limite)
+        elif mejor_camino is not None:
+            stats = self._stats(t0, nodos_expandidos, pico_memoria, mejor_camino, 'solved')
+        else:
+            stats = self._stats(t0, nodos_expandidos, pico_memoria, None, 'exhausted')
+        stats['soluciones'] = soluciones
+        stats['cota'] = cota
+        return mejor_camino, self._cache_stats(heuristic, stats, cache_ini)
+
+    # Movimientos desde initial_state que recorren la cadena de claves canónicas
+    # `claves` (la primera es la del propio initial_state). Sirve cuando los
+    # movimientos guardados no son fiables porque una clave se ha reabierto con
+    # otra permutación de tubos.
+    def _path_from_keys(self, initial_state, claves):
+        camino = []
+        estado = initial_state
+        for key_sig in claves[1:]:
+            for movimiento in self.game.get_valid_moves(estado):
+                nuevo_estado = self.game.apply_move(estado, movimiento)
+                if self._key(nuevo_estado) == key_sig:
+                    camino.append(movimiento)
+                    estado = nuevo_estado
+                    break
+            else:
+                raise ValueError("la cadena de claves no forma un camino")
+        return camino
+
+######################################################################################################################
+    # Búsqueda voraz primero el mejor: como A* pero ordenando solo por h. No garantiza
+    # el camino más corto, pero en los puzles grandes llega a la meta expandiendo muy
+    # pocos nodos.
+    def greedy_best_first(self, initial_state, heuristic, budget=None):
+        t0 = time.time()
+        initial_state = self.game.encode(initial_state)
+        ini_key = self._key(initial_state)
+
+        if self.game.is_goal_state(initial_state):
+            return [], self._stats(t0, 0, 1, [], 'solved')
+
+        cont = 0  # desempate en heapq
+        cache_ini = self._cache_counters(heuristic)
+        h0 = self._state_h(heuristic, initial_state, ini_key)
+        padres = ParentTable(self.game.num_tubes)
+        pendientes = [(h0, cont, initial_state, padres.add(-1, None))]
+
+        visitados = self._key_set(ini_key)
+
+        nodos_expandidos = 0
+        pico_memoria = 1
+
+        while pendientes:
+            limite = budget.exceeded(t0, nodos_expandidos, len(pendientes), pendientes[0][0]) if budget is not None else None
+            if limite:
+                return None, self._cache_stats(heuristic, self._stats(t0, nodos_expandidos, pico_memoria, None, 'budget', limite), cache_ini)
+            h, _, estado, nodo = heapq.heappop(pendientes)
+            nodos_expandidos += 1
+
+            hijos = []
+            for movimiento in self._moves(estado, padres.move(nodo)):
+                nuevo_estado = self.game.apply_move(estado, movimiento)
+                key_new = self._key(nuevo_estado)
+                if key_new in visitados:
+                    continue
+                visitados.add(key_new)
+
+                # La meta se comprueba al generar: ya no hay nada mejor que buscar
+                if self.game.is_goal_state(nuevo_estado):
+                    camino = padres.path(nodo) + [movimiento]
+                    stats = self._stats(t0, nodos_expandidos, pico_memoria, camino, 'solved')
+                    return camino, self._cache_stats(heuristic, stats, cache_ini)
+                hijos.append((movimiento, nuevo_estado, key_new))
+
+            for (movimiento, nuevo_estado, _), h_new in zip(hijos, self._children_h(heuristic, estado, h, hijos)):
+                cont += 1
+                heapq.heappush(pendientes, (h_new, cont, nuevo_estado, padres.add(nodo, movimiento)))
 
             pico_memoria = max(pico_memoria, len(pendientes) + len(visitados))
 
-        # Si no hay solución
-        t1 = time.time()
-        stats = {
-            'nodos_expandidos': nodos_expandidos,
-            'nodos_en_memoria_max': pico_memoria,
-            'tiempo_seg': t1 - t0,
-            'profundidad_solucion': None
-        }
-        return None, stats
+        stats = self._stats(t0, nodos_expandidos, pico_memoria, None, 'exhausted')
+        return None, self._cache_stats(heuristic, stats, cache_ini)
+
+    # Beam search: avanza por niveles quedándose solo con los `width` hijos de menor h.
+    # La memoria está acotada por el ancho: no hay conjunto de visitados global, solo
+    # se descartan los repetidos dentro del nivel y los del nivel anterior (para no
+    # deshacer el último paso). El camino se guarda como lista enlazada
+    # (movimiento, nodo_padre), así cada nivel solo mantiene vivas las ramas de su haz.
+    # Se para tras max_depth niveles o si el haz se queda vacío ('exhausted').
+    def beam_search(self, initial_state, heuristic, width=100, max_depth=1000, budget=None):
+        t0 = time.time()
+        initial_state = self.game.encode(initial_state)
+        ini_key = self._key(initial_state)
+
+        if self.game.is_goal_state(initial_state):
+            return [], self._stats(t0, 0, 1, [], 'solved')
+
+        cache_ini = self._cache_counters(heuristic)
+        h0 = self._state_h(heuristic, initial_state, ini_key)
+        haz = [(h0, initial_state, ini_key, None, None)]  # (h, estado, clave, último mov, nodo)
+        claves_anteriores = set()
+
+        nodos_expandidos = 0
+        pico_memoria = 1
+
+        for profundidad in range(max_depth):
+            claves_haz = {key for _, _, key, _, _ in haz}
+            siguiente = {}  # clave -> (h, cont, estado, movimiento, nodo)
+            cont = 0
+            for h, estado, key, ultimo, nodo in haz:
+                limite = budget.exceeded(t0, nodos_expandidos, len(haz) + len(siguiente), profundidad) if budget is not None else None
+                if limite:
+                    return None, self._cache_stats(heuristic, self._stats(t0, nodos_expandidos, pico_memoria, None, 'budget', limite), cache_ini)
+                nodos_expandidos += 1
+
+                hijos = []
+                for movimiento in self._moves(estado, ultimo):
+                    nuevo_estado = self.game.apply_move(estado, movimiento)
+                    key_new = self._key(nuevo_estado)
+                    if key_new in siguiente or key_new in claves_haz or key_new in claves_anteriores:
+                        continue
+                    nodo_new = (movimiento, nodo)
+                    if self.game.is_goal_state(nuevo_estado):
+                        camino = []
+                        while nodo_new is not None:
+                            camino.append(nodo_new[0])
+                            nodo_new = nodo_new[1]
+                        camino.reverse()
+                        stats = self._stats(t0, nodos_expandidos, pico_memoria, camino, 'solved')
+                        return camino, self._cache_stats(heuristic, stats, cache_ini)
+                    siguiente[key_new] = None
+                    hijos.append((movimiento, nuevo_estado, key_new))
+
+                for (movimiento, nuevo_estado, key_new), h_new in zip(hijos, self._children_h(heuristic, estado, h, hijos)):
+                    cont += 1
+                    siguiente[key_new] = (h_new, cont, nuevo_estado, movimiento, (movimiento, nodo))
+
+            pico_memoria = max(pico_memoria, len(haz) + len(siguiente) + len(claves_anteriores))
+            if not siguiente:
+                break
+
+            mejores = heapq.nsmallest(width, siguiente.items(), key=lambda item: item[1][:2])
+            haz = [(h, estado, key, movimiento, nodo) for key, (h, _, estado, movimiento, nodo) in mejores]
+            claves_anteriores = claves_haz
+
+        stats = self._stats(t0, nodos_expandidos, pico_memoria, None, 'exhausted')
+        return None, self._cache_stats(heuristic, stats, cache_ini)
+
+######################################################################################################################
+    # BFS por niveles en paralelo: cada nivel de la frontera se reparte en trozos
+    # entre un Pool de num_workers procesos, que generan los hijos (y sus claves) de
+    # sus estados. Después se recorren los resultados en el orden de la frontera,
+    # descartando repetidos contra visitados igual que bfs, así que el camino y las
+    # estadísticas son los mismos que los de bfs. Los niveles con menos de
+    # min_parallel_layer estados se expanden en este proceso.
+    def parallel_bfs(self, initial_state, num_workers=None, min_parallel_layer=64, budget=None):
+        t0 = time.time()
+        initial_state = self.game.encode(initial_state)
+        ini_key = self._key(initial_state)
+
+        if self.game.is_goal_state(initial_state):
+            return [], self._stats(t0, 0, 1, [], 'solved')
+
+        num_workers = num_workers or os.cpu_count() or 1
+        with mp.Pool(num_workers, initializer=_pool_init, initargs=(self._worker_config(),)) as pool:
+            padres = ParentTable(self.game.num_tubes)
+            nivel = [(initial_state, padres.add(-1, None), ini_key)]  # (estado, id del nodo, clave)
+            cerrados = self._key_set()
+            abiertos_set = self._key_set(ini_key)
+
+            nodos_expandidos = 0
+            pico_memoria = 1
+            profundidad = 0
+
+            while nivel:
+                entradas = [(estado, padres.move(nodo)) for estado, nodo, _ in nivel]
+                if len(nivel) < min_parallel_layer:
+                    expansiones = _expand_states(self, entradas)
+                else:
+                    tam = -(-len(nivel) // (4 * num_workers))
+                    trozos = [entradas[k:k + tam] for k in range(0, len(entradas), tam)]
+                    expansiones = [hijos for parte in pool.map(_pool_expand, trozos) for hijos in parte]
+
+                # Se simulan los popleft de bfs sobre el nivel, en el mismo orden
+                siguiente = []
+                for k, ((estado, nodo, key_estado), hijos) in enumerate(zip(nivel, expansiones)):
+                    pendientes_nivel = len(nivel) - k
+                    limite = budget.exceeded(t0, nodos_expandidos, pendientes_nivel + len(siguiente), profundidad) if budget is not None else None
+                    if limite:
+                        return None, self._stats(t0, nodos_expandidos, pico_memoria, None, 'budget', limite)
+                    cerrados.add(key_estado)
+                    nodos_expandidos += 1
+                    if self.game.is_goal_state(estado):
+                        camino = padres.path(nodo)
+
+                        pico_memoria = max(pico_memoria, pendientes_nivel - 1 + len(siguiente) + len(cerrados))
+                        stats = self._stats(t0, nodos_expandidos, pico_memoria, camino, 'solved')
+                        return camino, stats
+
+                    for movimiento, nuevo_estado, key in hijos:
+                        if key not in cerrados and key not in abiertos_set:
+                            siguiente.append((nuevo_estado, padres.add(nodo, movimiento), key))
+                            abiertos_set.add(key)
+                            pico_memoria = max(pico_memoria, pendientes_nivel - 1 + len(siguiente) + len(cerrados))
+                nivel = siguiente
+                profundidad += 1
+
+        stats = self._stats(t0, nodos_expandidos, pico_memoria, None, 'exhausted')
+        return cerrados, stats
+
+######################################################################################################################
+    # BFS en memoria externa, para cuando los visitados no caben en RAM. Cada nivel
+    # es un fichero en disco con las claves canónicas ordenadas (registros de tamaño
+    # fijo), y de cada estado solo se guarda su clave (state_from_key la convierte
+    # otra vez en estado). Para generar el nivel siguiente se recorre el actual y los
+    # hijos se acumulan en memoria hasta buffer_size; entonces se ordenan y se
+    # vuelcan a un fichero parcial. Al acabar el nivel se mezclan los parciales y se
+    # quitan los repetidos y los que ya estaban en algún nivel anterior (detección de
+    # duplicados diferida), recorriendo todos los ficheros en orden a la vez.
+    # El camino se rehace hacia atrás: para cada clave se busca en el nivel anterior
+    # un estado que la tenga como hija.
+    # nodos_en_memoria_max cuenta solo las claves en RAM; las del disco van en
+    # nodos_en_disco. Si no hay solución devuelve None (no hay conjunto de cerrados).
+    def external_bfs(self, initial_state, work_dir=None, buffer_size=100000, budget=None):
+        t0 = time.time()
+        initial_state = self.game.encode(initial_state)
+        ini_key = self._key(initial_state)
+
+        if self.game.is_goal_state(initial_state):
+            return [], self._stats(t0, 0, 1, [], 'solved')
+
+        tam_registro = self.game._key_struct.size
+        directorio = tempfile.mkdtemp(prefix="bfs_externo_", dir=work_dir)
+        try:
+            niveles = [os.path.join(directorio, "nivel_0.bin")]
+            with open(niveles[0], "wb") as f:
+                f.write(ini_key)
+
+            nodos_expandidos = 0
+            pico_memoria = 1
+            nodos_en_disco = 1
+            key_meta = None
+            key_padre_meta = None
+
+            while key_meta is None:
+                parciales = []
+                buffer = []
+                total_nivel = 0
+                for key_estado in _read_keys(niveles[-1], tam_registro):
+                    limite = budget.exceeded(t0, nodos_expandidos, len(buffer), len(niveles) - 1) if budget is not None else None
+                    if limite:
+                        stats = self._stats(t0, nodos_expandidos, pico_memoria, None, 'budget', limite)
+                        stats['nodos_en_disco'] = nodos_en_disco
+                        return None, stats
+                    estado = self.game.state_from_key(key_estado)
+                    nodos_expandidos += 1
+                    for movimiento in self._moves(estado):
+                        nuevo_estado = self.game.apply_move(estado, movimiento)
+                        key = self._key(nuevo_estado)
+                        if self.game.is_goal_state(nuevo_estado):
+                            key_meta, key_padre_meta = key, key_estado
+                            break
+                        buffer.append(key)
+                    pico_memoria = max(pico_memoria, len(buffer))
+                    if key_meta is not None:
+                        break
+                    if len(buffer) >= buffer_size:
+                        parciales.append(_write_sorted_run(directorio, len(niveles), len(parciales), buffer))
+                        buffer = []
+                if key_meta is not None:
+                    break
+                if buffer:
+                    parciales.append(_write_sorted_run(directorio, len(niveles), len(parciales), buffer))
+                    buffer = []
+                if not parciales:
+                    break
+
+                # Mezcla de los parciales sin repetidos ni claves de niveles anteriores
+                nuevo_nivel = os.path.join(directorio, "nivel_%d.bin" % len(niveles))
+                nuevas = heapq.merge(*(_read_keys(p, tam_registro) for p in parciales))
+                anteriores = heapq.merge(*(_read_keys(n, tam_registro) for n in niveles))
+                with open(nuevo_nivel, "wb") as f:
+                    for key in _sorted_difference(nuevas, anteriores):
+                        f.write(key)
+                        total_nivel += 1
+                for p in parciales:
+                    os.remove(p)
+                if not total_nivel:
+                    os.remove(nuevo_nivel)
+                    break
+                niveles.append(nuevo_nivel)
+                nodos_en_disco += total_nivel
+
+            if key_meta is None:
+                stats = self._stats(t0, nodos_expandidos, pico_memoria, None, 'exhausted')
+                stats['nodos_en_disco'] = nodos_en_disco
+                return None, stats
+
+            # Reconstrucción hacia atrás, nivel a nivel
+            claves = [key_meta, key_padre_meta]
+            for nivel in reversed(niveles[:-1]):
+                buscada = claves[-1]
+                for key_estado in _read_keys(nivel, tam_registro):
+                    estado = self.game.state_from_key(key_estado)
+                    if any(self._key(self.game.apply_move(estado, m)) == buscada for m in self._moves(estado)):
+                        claves.append(key_estado)
+                        break
+            claves.reverse()
+            camino = self._path_from_keys(initial_state, claves)
+
+            stats = self._stats(t0, nodos_expandidos, pico_memoria, camino, 'solved')
+            stats['nodos_en_disco'] = nodos_en_disco
+            return camino, stats
+        finally:
+            shutil.rmtree(directorio, ignore_errors=True)
 
 ######################################################################################################################
+    # A* paralelo al estilo HDA*: cada estado tiene un proceso dueño (crc32 de su clave
+    # canónica módulo num_workers), que es el único que guarda su g, su padre y lo
+    # expande. Va por rondas: en cada una el coordinador reparte a cada proceso los
+    # hijos que le han mandado los demás, y cada proceso expande hasta
+    # batch_expansions nodos de su abierta con f < incumbente (el mejor coste de meta
+    # visto). Los hijos de los que es dueño los mete directamente en su abierta (así
+    # con un solo proceso expande lo mismo que a_star) y los demás los devuelve
+    # agrupados por dueño.
+    # Se termina cuando el incumbente es <= que la menor f de todas las abiertas y de
+    # los mensajes por entregar, así que con una heurística admisible el camino es
+    # óptimo. Con una cuota pequeña se expande más en orden de f (menos nodos de más)
+    # a cambio de más rondas de mensajes.
+    # El camino se rehace preguntando a cada dueño por el padre de la clave.
+    # La heurística pasa por su nombre (h1, h2, h3) y cada proceso rehace la partida
+    # con las mismas opciones que este SearchAlgorithm.
+    def parallel_a_star(self, initial_state, heuristic, num_workers=None, batch_expansions=50, budget=None):
+        t0 = time.time()
+        initial_state = self.game.encode(initial_state)
+        ini_key = self._key(initial_state)
+
+        if self.game.is_goal_state(initial_state):
+            return [], self._stats(t0, 0, 1, [], 'solved')
+
+        # los procesos abren la base de datos de patrones desde su directorio
+        if heuristic.__name__ == 'h_pdb' and self.pattern_db is not None and self.pattern_db.directorio is None:
+            raise ValueError("parallel_a_star con h_pdb necesita una base de datos de patrones guardada en disco"
+                             " (PatternDatabase.save o load_or_build)")
+        num_workers = num_workers or os.cpu_count() or 1
+        config = self._worker_config()
+        conexiones = []
+        procesos = []
+        for indice in range(num_workers):
+            conn, conn_hijo = mp.Pipe()
+            proceso = mp.Process(target=_hda_worker, daemon=True,
+                                 args=(conn_hijo, config, heuristic.__name__, indice, num_workers))
+            proceso.start()
+            conn_hijo.close()
+            conexiones.append(conn)
+            procesos.append(proceso)
+
+        try:
+            h0 = self._state_h(heuristic, initial_state, ini_key)
+            entrantes = [[] for _ in range(num_workers)]
+            entrantes[_hda_owner(ini_key, num_workers)].append((ini_key, initial_state, 0, h0, None))
+            incumbente = float('inf')
+            key_meta = None
+            nodos_expandidos = 0
+            pico_memoria = 1
+            frontera = 1
+
+            while True:
+                limite = budget.exceeded(t0, nodos_expandidos, frontera) if budget is not None else None
+                if limite:
+                    return None, self._stats(t0, nodos_expandidos, pico_memoria, None, 'budget', limite)
+
+                for conn, lote in zip(conexiones, entrantes):
+                    conn.send(('ronda', lote, incumbente, batch_expansions))
+                entrantes = [[] for _ in range(num_workers)]
+                min_f = float('inf')
+                memoria = 0
+                frontera = 0
+                for conn in conexiones:
+                    salientes, f_local, expandidos, abiertos, guardados, meta = conn.recv()
+                    nodos_expandidos += expandidos
+                    min_f = min(min_f, f_local)
+                    memoria += abiertos + guardados
+                    frontera += abiertos
+                    if meta is not None and meta[0] < incumbente:
+                        incumbente, key_meta = meta
+                    for dueño, lote in enumerate(salientes):
+                        entrantes[dueño].extend(lote)
+
+                en_transito = sum(len(lote) for lote in entrantes)
+                frontera += en_transito
+                pico_memoria = max(pico_memoria, memoria + en_transito)
+                if en_transito:
+                    min_f = min(min_f, min(g + h for lote in entrantes for _, _, g, h, _ in lote))
+                if incumbente <= min_f:
+                    break
+
+            if key_meta is None:
+                return None, self._stats(t0, nodos_expandidos, pico_memoria, None, 'exhausted')
+
+            claves = [key_meta]
+            while True:
+                conn = conexiones[_hda_owner(claves[-1], num_workers)]
+                conn.send(('padre', claves[-1]))
+                key_padre = conn.recv()
+                if key_padre is None:
+                    break
+                claves.append(key_padre)
+            claves.reverse()
+            camino = self._path_from_keys(initial_state, claves)
+
+            stats = self._stats(t0, nodos_expandidos, pico_memoria, camino, 'solved')
+            stats['procesos'] = num_workers
+            return camino, stats
+        finally:
+            for conn in conexiones:
+                try:
+                    conn.send(('fin',))
+                except OSError:
+                    pass
+                conn.close()
+            for proceso in procesos:
+                proceso.join(timeout=1)
+                if proceso.is_alive():
+                    proceso.kill()
+
+######################################################################################################################
+    # Las heurísticas trabajan sobre el contenido de cada tubo (tube_contents), así
+    # valen igual para la matriz numpy que para el estado empaquetado.
+    #
+    # Cada una tiene además una forma incremental: hX_contrib(estado) calcula una vez
+    # por nodo expandido lo que aporta cada tubo (o cada color en h1) y
+    # hX_delta(h, contrib, movimiento, nuevo_origen, nuevo_destino) da la h del hijo
+    # mirando solo los dos tubos que cambian (dados como int, ver tube_value).
     def h1(self,state):
-        colors = np.unique(state[state!=0])
+        count = {}  # color -> unidades de ese color en cada tubo donde aparece
+        for value in self.game.tube_values(state):
+            for color, n in self._color_count(value).items():
+                count.setdefault(color, []).append(n)
         h = 0
-        for color in colors:
-            count = np.array([np.sum(tube == color) for tube in state])
-            tubes_with_color = np.sum(count>0)
-
-            if tubes_with_color <=1:
-                continue
-            
-            main_tube_idx = np.argmax(count)
-            main_amount = count[main_tube_idx]
+        for color in count:
+            h += self._h1_color(count[color])
+        return h
 
-            weight_dispersion = np.sum(count) - main_amount
+    def _h1_color(self, count):
+        tubes_with_color = len(count)
 
-            h+= (tubes_with_color-1)*weight_dispersion
+        if tubes_with_color <=1:
+            return 0
+        
+        main_amount = max(count)
+
+        weight_dispersion = sum(count) - main_amount
+
+        return (tubes_with_color-1)*weight_dispersion
+
+    # unidades de cada color en un tubo, memorizado por valor del tubo
+    def _color_count(self, value):
+        tube_count = self._color_count_cache.get(value)
+        if tube_count is None:
+            tube_count = {}
+            for c in self.game.tube_contents_of(value):
+                tube_count[c] = tube_count.get(c, 0) + 1
+            self._color_count_cache[value] = tube_count
+        return tube_count
+
+    def h1_contrib(self, state):
+        values = self.game.tube_values(state)
+        por_color = {}  # color -> {tubo: unidades}
+        for t, value in enumerate(values):
+            for color, n in self._color_count(value).items():
+                por_color.setdefault(color, {})[t] = n
+        return values, por_color
+
+    def h1_delta(self, h, contrib, move, new_src, new_dst):
+        values, por_color = contrib
+        i, j = move
+        nuevos = {i: self._color_count(new_src), j: self._color_count(new_dst)}
+        # solo cambia el reparto de los colores que estaban en los dos tubos tocados
+        for color in set(self._color_count(values[i])) | set(self._color_count(values[j])):
+            reparto = dict(por_color[color])
+            for t in (i, j):
+                n = nuevos[t].get(color, 0)
+                if n:
+                    reparto[t] = n
+                else:
+                    reparto.pop(t, None)
+            h += self._h1_color(list(reparto.values())) - self._h1_color(list(por_color[color].values()))
         return h
     
     def h2(self,state):
-        incomplete_tubes = 0
-        well_positioned_colors = 0
+        return sum(self._h2_tube(v) for v in self.game.tube_values(state))
 
-        for tube in state:
-            colors = [c for c in tube if c!=0]
+    # lo que aporta un tubo a h2: 4 menos los colores bien colocados abajo si el
+    # tubo está sin terminar, 0 si está vacío o completo
+    def _h2_tube(self, value):
+        h = self._h2_cache.get(value)
+        if h is None:
+            h = 0
+            colors = self.game.tube_contents_of(value)
 
             if len(colors) == 0:
-                continue
-            if len(colors)==4 and all(c==colors[0] for c in colors):
-                continue
-
-            incomplete_tubes+=1
-
-            if len(colors)>0:
+                pass
+            elif len(colors)==4 and all(c==colors[0] for c in colors):
+                pass
+            else:
                 lc = len(colors)
                 base_color = colors[-1]
                 consecutive = 1
@@ -433,154 +1854,192 @@ class SearchAlgorithm:
                         consecutive+=1
                     else:
                         break
-            well_positioned_colors+=consecutive
-        h = (incomplete_tubes*4)-well_positioned_colors
+                h = 4 - consecutive
+            self._h2_cache[value] = h
         return h
+
+    def h2_contrib(self, state):
+        return [self._h2_tube(v) for v in self.game.tube_values(state)]
+
+    def h2_delta(self, h, contrib, move, new_src, new_dst):
+        i, j = move
+        return h - contrib[i] - contrib[j] + self._h2_tube(new_src) + self._h2_tube(new_dst)
     
 ############################################## OPCIONAL ##############################################
 
     def h3(self, state):
+        return sum(self._h3_tube(v) for v in self.game.tube_values(state))
+
+    # unidades mezcladas + 2 * bloqueadas de un tubo
+    def _h3_tube(self, value):
+        h = self._h3_cache.get(value)
+        if h is not None:
+            return h
    
         total_mezcladas = 0
         total_bloqueadas = 0
 
-        for tube in state:
-            #contenidos reales sin ceros
-            contents = [int(c) for c in tube if c != 0]
-            if not contents:
-                continue
+        #contenidos reales sin ceros
+        contents = self.game.tube_contents_of(value)
+        
+        #aqui contamos cuantos colores distintos hay en el tubo
+        colores_distintos = len(set(contents))
+        if colores_distintos > 1:
+            #todas cuentn como mezcladas
+            total_mezcladas += len(contents)
+
+            # contamos cuants de arriba son de color distinto
+            for i in range(len(contents)):
+                ci = contents[i] #color del bloque actual
+                # mira los de arriba: indices [0..i-1]
+                for j in range(i):
+                    #si alguna de las de arriba es de distinto color, la unidad está bloqueada
+                    if contents[j] != ci:
+                        total_bloqueadas += 1
+
+        h = total_mezcladas + 2 * total_bloqueadas
+        self._h3_cache[value] = h
+        return h
 
-            
-            #aqui contamos cuantos colores distintos hay en el tubo
-            colores_distintos = len(set(contents))
-            if colores_distintos > 1:
-                #todas cuentn como mezcladas
-                total_mezcladas += len(contents)
-
-                # contamos cuants de arriba son de color distinto
-                for i in range(len(contents)):
-                    ci = contents[i] #color del bloque actual
-                    # mira los de arriba: indices [0..i-1]
-                    for j in range(i):
-                        #si alguna de las de arriba es de distinto color, la unidad está bloqueada
-                        if contents[j] != ci:
-                            total_bloqueadas += 1
-           
+    def h3_contrib(self, state):
+        return [self._h3_tube(v) for v in self.game.tube_values(state)]
 
-        return total_mezcladas + 2 * total_bloqueadas
+    def h3_delta(self, h, contrib, move, new_src, new_dst):
+        i, j = move
+        return h - contrib[i] - contrib[j] + self._h3_tube(new_src) + self._h3_tube(new_dst)
+
+    # Versiones vectorizadas: reciben una matriz (k, num_tubes, capacity) con k
+    # estados y devuelven un array con la h de cada uno.
+    def h1_batch(self, states):
+        states = np.asarray(states)
+        colors = np.arange(1, self.game.num_colors + 1)
+        count = (states[..., None] == colors).sum(axis=2)  # (k, tubos, colores)
+        tubes_with_color = (count > 0).sum(axis=1)
+        weight_dispersion = count.sum(axis=1) - count.max(axis=1)
+        h = np.where(tubes_with_color > 1, (tubes_with_color - 1) * weight_dispersion, 0)
+        return h.sum(axis=1)
+
+    def h2_batch(self, states):
+        states = np.asarray(states)
+        lens = (states != 0).sum(axis=2)
+        base_color = states[:, :, -1]
+        # colores seguidos iguales al de abajo, contando desde abajo
+        iguales = (states == base_color[..., None])[:, :, ::-1]
+        consecutive = np.cumprod(iguales, axis=2).sum(axis=2)
+        complete = (lens == 4) & (consecutive == 4)
+        incomplete = (lens > 0) & ~complete
+        return (incomplete * (4 - consecutive)).sum(axis=1)
+
+    def h3_batch(self, states):
+        states = np.asarray(states)
+        cap = states.shape[2]
+        nz = states != 0
+        # parejas (arriba, abajo) de unidades de distinto color dentro del mismo tubo
+        distintas = (states[:, :, :, None] != states[:, :, None, :]) & nz[:, :, :, None] & nz[:, :, None, :]
+        arriba = np.triu(np.ones((cap, cap), dtype=bool), 1)
+        total_bloqueadas = (distintas & arriba).sum(axis=(2, 3))
+        total_mezcladas = np.where(total_bloqueadas > 0, nz.sum(axis=2), 0)
+        return (total_mezcladas + 2 * total_bloqueadas).sum(axis=1)
+
+    # Heurística de la base de datos de patrones (pattern_db): admisible, así que
+    # A* e IDA* dan el camino más corto con ella. Sin pattern_db da ValueError en la
+    # primera llamada, que las búsquedas hacen con el estado inicial antes de expandir.
+    def h_pdb(self, state):
+        if self.pattern_db is None:
+            raise ValueError("h_pdb necesita un SearchAlgorithm con pattern_db (ver pattern_db.py)")
+        return self.pattern_db.value(self.game, state)
 
 #################################################################################################
 
-    def dls(self, initial_state,limit):
+    def dls(self, initial_state,limit, budget=None):
             t0 = time.time()
-            ini_key = self.game.state_to_tuple(initial_state)
-            ini_hash = self.game.hash_state(ini_key)
+            initial_state = self.game.encode(initial_state)
+            ini_key = self._key(initial_state)
 
             if self.game.is_goal_state(initial_state):
-                t1 = time.time()
-                return [], {
-                    'nodos_expandidos': 0,
-                    'nodos_en_memoria_max': 1,
-                    'tiempo_seg': t1 - t0,
-                    'profundidad_solucion': 0
-                }
-
-            abiertos = deque([(initial_state, 0)]) #cada elemento : estado,profundidad
-            cerrados = set()
-            abiertos_set = {ini_hash}    
-            padre = {ini_key: None}               
-            mov_que_lleva = {}                   
+                return [], self._stats(t0, 0, 1, [], 'solved')
+
+            padres = ParentTable(self.game.num_tubes)
+            abiertos = deque([(initial_state, 0, padres.add(-1, None))]) #cada elemento : estado,profundidad,id del nodo
+            cerrados = self._key_set()
+            abiertos_set = self._key_set(ini_key)
 
             nodos_expandidos = 0
             pico_memoria = len(cerrados) + len(abiertos)
 
             while abiertos:
-                estado,profundidad = abiertos.pop()
-                key_estado = self.game.state_to_tuple(estado)
-                hash_estado = self.game.hash_state(key_estado)
-                cerrados.add(hash_estado)
+                limite = budget.exceeded(t0, nodos_expandidos, len(abiertos), abiertos[-1][1]) if budget is not None else None
+                if limite:
+                    return None, self._stats(t0, nodos_expandidos, pico_memoria, None, 'budget', limite)
+                estado,profundidad,nodo = abiertos.pop()
+                key_estado = self._key(estado)
+                cerrados.add(key_estado)
                 nodos_expandidos += 1
                 if self.game.is_goal_state(estado):
             
-                    camino = []
-                    cur = key_estado
-                    while padre[cur] is not None:
-                        camino.append(mov_que_lleva[cur])
-                        cur = padre[cur]
-                    camino.reverse()
+                    camino = padres.path(nodo)
 
-                    t1 = time.time()
                     pico_memoria = max(pico_memoria, len(abiertos) + len(cerrados))
-                    stats = {
-                        'nodos_expandidos': nodos_expandidos,
-                        'nodos_en_memoria_max': pico_memoria,
-                        'tiempo_seg': t1 - t0,
-                        'profundidad_solucion': len(camino)
-                    }
+                    stats = self._stats(t0, nodos_expandidos, pico_memoria, camino, 'solved')
                     return camino, stats
                 if profundidad < limit:
-                    for movimiento in self.game.get_valid_moves(estado): 
+                    for movimiento in self._moves(estado, padres.move(nodo)): 
                         nuevo_estado = self.game.apply_move(estado, movimiento)
 
-                        key = self.game.state_to_tuple(nuevo_estado)
-                        hash_new_state = self.game.hash_state(key)
+                        key = self._key(nuevo_estado)
 
-                        if hash_new_state not in cerrados and hash_new_state not in abiertos_set:
-                            padre[key] = key_estado  
-                            mov_que_lleva[key] = movimiento
-                            abiertos.append((nuevo_estado,profundidad+1))
-                            abiertos_set.add(hash_new_state)
+                        if key not in cerrados and key not in abiertos_set:
+                            abiertos.append((nuevo_estado,profundidad+1,padres.add(nodo, movimiento)))
+                            abiertos_set.add(key)
                             pico_memoria = max(pico_memoria, len(abiertos) + len(cerrados))
 
-            t1 = time.time()
-            stats = {
-                'nodos_expandidos': nodos_expandidos,
-                'nodos_en_memoria_max': pico_memoria,
-                'tiempo_seg': t1 - t0,
-                'profundidad_solucion': None
-            }
+            stats = self._stats(t0, nodos_expandidos, pico_memoria, None, 'exhausted')
             return None, stats
     
 
 ######################################################################################################################
-    def ida_star(self, initial_state, heuristic):
-        
+    # memory_light=True usa el IDA* recursivo de _ida_star_light, que solo guarda el
+    # camino actual (y una tabla de transposición de como mucho tt_size estados).
+    def ida_star(self, initial_state, heuristic, memory_light=False, tt_size=0, budget=None):
+        if memory_light:
+            return self._ida_star_light(initial_state, heuristic, tt_size, budget)
 
         t0 = time.time()
-        ini_key = self.game.state_to_tuple(initial_state)
-        ini_hash = self.game.hash_state(ini_key)
+        initial_state = self.game.encode(initial_state)
+        ini_key = self._key(initial_state)
 
         # Caso trivial: ya está resuelto
         if self.game.is_goal_state(initial_state):
-            t1 = time.time()
-            return [], {
-                'nodos_expandidos': 0,
-                'nodos_en_memoria_max': 1,
-                'tiempo_seg': t1 - t0,
-                'profundidad_solucion': 0
-            }
+            return [], self._stats(t0, 0, 1, [], 'solved')
 
         
-        threshold = heuristic(initial_state) # poda ← f(s0)
+        cache_ini = self._cache_counters(heuristic)
+        h0 = self._state_h(heuristic, initial_state, ini_key)
+        threshold = h0 # poda ← f(s0)
         nodos_expandidos = 0
         pico_memoria = 1
 
         
+        # Como en la versión original, los estados repetidos (misma clave canónica) no
+        # se descartan al sacarlos de abiertos, y el padre de cada estado exacto (tubos
+        # en su orden) es el del último que lo metió en abiertos: así los nodos y las
+        # profundidades son las mismas que antes.
+        ini_exacta = tuple(self.game.tube_values(initial_state))
         while True:
-            abiertos = deque([(initial_state, 0)])  # (estado, coste g) -- Camino ← [s0]
-            padre = {ini_key: None}
-            mov_que_lleva = {}
-            cerrados = set()
+            padre = {ini_exacta: None}  # estado exacto -> (estado exacto del padre, movimiento)
+            abiertos = deque([(initial_state, 0, h0, ini_exacta, None)])  # (estado, coste g, h, estado exacto, último mov) -- Camino ← [s0]
+            cerrados = self._key_set()
             next_threshold = float('inf')#sig-poda ← ∞
 
             while abiertos:
-                estado, g = abiertos.pop()
-                key_estado = self.game.state_to_tuple(estado)
-                hash_estado = self.game.hash_state(key_estado)
-                cerrados.add(hash_estado)
+                limite = budget.exceeded(t0, nodos_expandidos, len(abiertos), threshold) if budget is not None else None
+                if limite:
+                    return None, self._cache_stats(heuristic, self._stats(t0, nodos_expandidos, pico_memoria, None, 'budget', limite), cache_ini)
+                estado, g, h, exacta, ultimo = abiertos.pop()
+                cerrados.add(self._key(estado))
                 nodos_expandidos += 1
 
-                f = g + heuristic(estado)
+                f = g + h
                 if f > threshold:
                     next_threshold = min(next_threshold, f) #actualizar sig-poda
                     continue
@@ -588,46 +2047,285 @@ class SearchAlgorithm:
                 
                 if self.game.is_goal_state(estado): # ← último(Camino) ∈ Objetivos
                     camino = []
-                    cur = key_estado
-                    while padre[cur] is not None:
-                        camino.append(mov_que_lleva[cur])
-                        cur = padre[cur]
+                    while padre[exacta] is not None:
+                        exacta, movimiento = padre[exacta]
+                        camino.append(movimiento)
                     camino.reverse()
-                    t1 = time.time()
                     pico_memoria = max(pico_memoria, len(abiertos) + len(cerrados))
-                    stats = {
-                        'nodos_expandidos': nodos_expandidos,
-                        'nodos_en_memoria_max': pico_memoria,
-                        'tiempo_seg': t1 - t0,
-                        'profundidad_solucion': len(camino)
-                    }
-                    return camino, stats
+                    stats = self._stats(t0, nodos_expandidos, pico_memoria, camino, 'solved')
+                    return camino, self._cache_stats(heuristic, stats, cache_ini)
 
                 
-                for movimiento in self.game.get_valid_moves(estado): # ← avanzar
+                hijos = []
+                for movimiento in self._moves(estado, ultimo): # ← avanzar
                     nuevo_estado = self.game.apply_move(estado, movimiento)
-                    key_new = self.game.state_to_tuple(nuevo_estado)
-                    hash_new = self.game.hash_state(key_new)
+                    key_new = self._key(nuevo_estado)
 
-                    if hash_new not in cerrados:
-                        padre[key_new] = key_estado
-                        mov_que_lleva[key_new] = movimiento
-                        abiertos.append((nuevo_estado, g + 1))
-                        pico_memoria = max(pico_memoria, len(abiertos) + len(cerrados))
+                    if key_new not in cerrados:
+                        hijos.append((movimiento, nuevo_estado, key_new))
+
+                valores_h = self._children_h(heuristic, estado, h, hijos)
+                for (movimiento, nuevo_estado, _), h_new in zip(hijos, valores_h):
+                    exacta_new = tuple(self.game.tube_values(nuevo_estado))
+                    padre[exacta_new] = (exacta, movimiento)
+                    abiertos.append((nuevo_estado, g + 1, h_new, exacta_new, movimiento))
+                    pico_memoria = max(pico_memoria, len(abiertos) + len(cerrados))
 
             
             if next_threshold == float('inf'):  #← si Camino=[] y sig-poda = ∞
-                t1 = time.time()
-                stats = {
-                    'nodos_expandidos': nodos_expandidos,
-                    'nodos_en_memoria_max': pico_memoria,
-                    'tiempo_seg': t1 - t0,
-                    'profundidad_solucion': None
-                }
-                return None, stats
+                stats = self._stats(t0, nodos_expandidos, pico_memoria, None, 'exhausted')
+                return None, self._cache_stats(heuristic, stats, cache_ini)
 
             
             threshold = next_threshold  #  poda ← sig-poda; empezar de nuevo
 
+######################################################################################################################
+    # IDA* de verdad: búsqueda en profundidad recursiva acotada por f que solo guarda
+    # el camino actual. El estado es una lista con el valor de cada tubo que se
+    # modifica en el sitio al bajar y se restaura al volver, junto con su resumen
+    # (tube_info) y la h, que se actualizan solo en los dos tubos tocados.
+    # Los ciclos se evitan mirando las claves del camino actual; la tabla de
+    # transposición (si tt_size > 0) guarda el menor g con que se ha visto cada clave
+    # en esta iteración y poda al volver a llegar con un g igual o peor.
+    def _ida_star_light(self, initial_state, heuristic, tt_size, budget=None):
+        t0 = time.time()
+        game = self.game
+        tubes = game.tube_values(game.encode(initial_state))
+        summary = [game.tube_info(v) for v in tubes]
+        ini_key = self._key(tubes)
+
+        if all(complete or empty for _, _, _, complete, empty in summary):
+            return [], self._stats(t0, 0, 1, [], 'solved')
+
+        cache_ini = self._cache_counters(heuristic)
+        cache = self._h_caches.get(heuristic)
+        forma = self._delta_forms.get(heuristic) if self.incremental else None
+        h0 = self._state_h(heuristic, game.from_tube_values(tubes), ini_key)
+
+        camino = []
+        en_camino = {ini_key}
+        tt = OrderedDict()
+        nodos_expandidos = 0
+        pico_memoria = 1
+
+        def buscar(g, h, threshold, last_move):
+            nonlocal nodos_expandidos, pico_memoria
+            f = g + h
+            if f > threshold:
+                return f
+            if all(complete or empty for _, _, _, complete, empty in summary):
+                return True
+            if budget is not None:
+                limite = budget.exceeded(t0, nodos_expandidos, len(en_camino), threshold)
+                if limite:
+                    raise _BudgetExceeded(limite)
+            nodos_expandidos += 1
+            pico_memoria = max(pico_memoria, len(en_camino) + len(tt))
+
+            next_threshold = float('inf')
+            contrib = forma[0](tubes) if forma is not None else None
+            for i, j in game.get_valid_moves(None, summary, prune=self.prune, last_move=last_move):
+                vi, vj = tubes[i], tubes[j]
+                si, sj = summary[i], summary[j]
+                ni, nj = game._pour(vi, vj)
+                tubes[i], tubes[j] = ni, nj
+                summary[i], summary[j] = game.tube_info(ni), game.tube_info(nj)
+                key = self._key(tubes)
+
+                podar = key in en_camino
+                if not podar and tt_size:
+                    visto = tt.get(key)
+                    if visto is not None and visto <= g + 1:
+                        podar = True
+                    else:
+                        tt[key] = g + 1
+                        if len(tt) > tt_size:
+                            tt.popitem(last=False)
+
+                if not podar:
+                    h_new = cache.get(key) if cache is not None else None
+                    if h_new is None:
+                        if forma is not None:
+                            h_new = forma[1](h, contrib, (i, j), ni, nj)
+                        else:
+                            h_new = heuristic(game.from_tube_values(tubes))
+                        if cache is not None:
+                            cache.put(key, h_new)
+                    en_camino.add(key)
+                    camino.append((i, j))
+                    r = buscar(g + 1, h_new, threshold, (i, j))
+                    if r is True:
+                        return True
+                    camino.pop()
+                    en_camino.discard(key)
+                    next_threshold = min(next_threshold, r)
+
+                tubes[i], tubes[j] = vi, vj
+                summary[i], summary[j] = si, sj
+            return next_threshold
+
+        threshold = h0
+        while True:
+            tt.clear()
+            try:
+                r = buscar(0, h0, threshold, None)
+            except _BudgetExceeded as e:
+                stats = self._stats(t0, nodos_expandidos, pico_memoria, None, 'budget', e.limite)
+                return None, self._cache_stats(heuristic, stats, cache_ini)
+            if r is True:
+                stats = self._stats(t0, nodos_expandidos, pico_memoria, camino, 'solved')
+                return list(camino), self._cache_stats(heuristic, stats, cache_ini)
+            if r == float('inf'):
+                stats = self._stats(t0, nodos_expandidos, pico_memoria, None, 'exhausted')
+                return None, self._cache_stats(heuristic, stats, cache_ini)
+            threshold = r
+
+
+# Proceso dueño de una clave canónica en parallel_a_star (estable entre procesos,
+# a diferencia de hash())
+def _hda_owner(key, num_workers):
+    return zlib.crc32(key) % num_workers
+
+
+# Lo que ejecuta cada proceso de parallel_a_star. Guarda abierta, g, padre y
+# cerrados solo de las claves de las que es dueño y atiende tres mensajes:
+# ('ronda', entrantes, incumbente, cuota), ('padre', clave) y ('fin',).
+def _hda_worker(conn, config, heuristic_name, indice, num_workers):
+    solver = _solver_from_config(config)
+    game = solver.game
+    heuristic = getattr(solver, heuristic_name)
+
+    abiertos = []
+    g_cost = solver._key_costs()
+    padre = {}
+    cerrados = solver._key_set()
+    cont = 0  # desempate en heapq
+
+    while True:
+        mensaje = conn.recv()
+        if mensaje[0] == 'fin':
+            break
+        if mensaje[0] == 'padre':
+            conn.send(padre[mensaje[1]])
+            continue
+
+        _, entrantes, incumbente, cuota = mensaje
+        for key, estado, g, h, key_padre in entrantes:
+            # un g mejor reabre el estado aunque ya se hubiera expandido
+            if key not in g_cost or g < g_cost[key]:
+                g_cost[key] = g
+                padre[key] = key_padre
+                cerrados.discard(key)
+                cont += 1
+                heapq.heappush(abiertos, (g + h, g, cont, estado, h))
+
+        salientes = [[] for _ in range(num_workers)]
+        expandidos = 0
+        meta = None
+        while abiertos and expandidos < cuota and abiertos[0][0] < incumbente:
+            f, g, _, estado, h = heapq.heappop(abiertos)
+            key = solver._key(estado)
+            if g > g_cost[key] or key in cerrados:
+                continue
+            cerrados.add(key)
+            expandidos += 1
+
+            if game.is_goal_state(estado):
+                if g < incumbente:
+                    incumbente = g
+                    meta = (g, key)
+                continue
+
+            hijos = []
+            dueños = []
+            for movimiento in solver._moves(estado):
+                nuevo_estado = game.apply_move(estado, movimiento)
+                key_new = solver._key(nuevo_estado)
+                dueño = _hda_owner(key_new, num_workers)
+                if dueño == indice:
+                    if key_new in g_cost and g_cost[key_new] <= g + 1:
+                        continue
+                    # los hijos propios van directos a la abierta, así se expanden
+                    # en orden de f en esta misma ronda
+                    g_cost[key_new] = g + 1
+                    padre[key_new] = key
+                    cerrados.discard(key_new)
+                hijos.append((movimiento, nuevo_estado, key_new))
+                dueños.append(dueño)
+            valores_h = solver._children_h(heuristic, estado, h, hijos)
+            for (_, nuevo_estado, key_new), dueño, h_new in zip(hijos, dueños, valores_h):
+                if dueño == indice:
+                    cont += 1
+                    heapq.heappush(abiertos, (g + 1 + h_new, g + 1, cont, nuevo_estado, h_new))
+                else:
+                    salientes[dueño].append((key_new, nuevo_estado, g + 1, h_new, key))
 
+        min_f = abiertos[0][0] if abiertos else float('inf')
+        conn.send((salientes, min_f, expandidos, len(abiertos), len(g_cost), meta))
+    conn.close()
 
+
+# Rehace en otro proceso el SearchAlgorithm descrito por _worker_config
+def _solver_from_config(config):
+    num_tubes, num_colors, seed, opciones = config
+    return SearchAlgorithm(WaterSortGame(num_tubes, num_colors, seed), **opciones)
+
+
+# Hijos (movimiento, nuevo_estado, clave) de cada (estado, último movimiento) de
+# `entradas`, en el orden de get_valid_moves
+def _expand_states(solver, entradas):
+    expansiones = []
+    for estado, ultimo in entradas:
+        hijos = []
+        for movimiento in solver._moves(estado, ultimo):
+            nuevo_estado = solver.game.apply_move(estado, movimiento)
+            hijos.append((movimiento, nuevo_estado, solver._key(nuevo_estado)))
+        expansiones.append(hijos)
+    return expansiones
+
+
+# Cada proceso del Pool de parallel_bfs guarda su propio SearchAlgorithm
+_pool_solver = None
+
+
+def _pool_init(config):
+    global _pool_solver
+    _pool_solver = _solver_from_config(config)
+
+
+def _pool_expand(entradas):
+    return _expand_states(_pool_solver, entradas)
+
+
+# Claves de tamaño fijo de un fichero de external_bfs, en el orden en que están
+def _read_keys(ruta, tam_registro, registros_por_lectura=65536):
+    with open(ruta, "rb") as f:
+        while True:
+            bloque = f.read(tam_registro * registros_por_lectura)
+            if not bloque:
+                break
+            for k in range(0, len(bloque), tam_registro):
+                yield bloque[k:k + tam_registro]
+
+
+# Ordena las claves (sin repetidas) y las escribe en un fichero parcial del nivel
+def _write_sorted_run(directorio, nivel, indice, claves):
+    ruta = os.path.join(directorio, "nivel_%d_parcial_%d.bin" % (nivel, indice))
+    with open(ruta, "wb") as f:
+        f.write(b"".join(sorted(set(claves))))
+    return ruta
+
+
+# Claves de `nuevas` que no están en `anteriores`, sin repetir. Las dos entradas
+# van ordenadas (pueden tener repetidas), así que basta con recorrerlas a la vez.
+def _sorted_difference(nuevas, anteriores):
+    anterior = next(anteriores, None)
+    ultima = None
+    for key in nuevas:
+        if key == ultima:
+            continue
+        ultima = key
+        while anterior is not None and anterior < key:
+            anterior = next(anteriores, None)
+        if anterior != key:
+            yield key